@@ -2,7 +2,11 @@ from django.contrib import admin
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
-from .models import Profile, Business, Service, Staff, BookingForm, Appointment, ClientProfile
+from .models import (
+    Profile, Business, Service, Staff, BookingForm, Appointment, ClientProfile,
+    EmailOutbox, VisitorDailyStat, VisitorSession, DailyBusinessStats, DailyStaffStats,
+    ClientStats, WorkingHours, ScheduleOverride,
+)
 from django.contrib import admin
 from .models import SavedBusiness, Review
 # admin.py
@@ -135,8 +139,64 @@ class AppointmentAdmin(admin.ModelAdmin):
     list_display = ('guest_name', 'id', 'customer', 'booking_form', 'service', 'staff', 'appointment_date', 'appointment_start_time', 'status')
     # Filter by the new status choices
     list_filter = ('status', 'appointment_date', 'booking_form')
-    search_fields = ('customer__username', 'booking_form__business__name', 'service__name')
+    search_fields = ('customer__username', 'business__name', 'service__name')
     date_hierarchy = 'appointment_date'
 
     # Optional: Make it easy to change status directly from the list view
-    list_editable = ('status',)
\ No newline at end of file
+    list_editable = ('status',)
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipients', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'recipients', 'last_error')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+
+
+@admin.register(VisitorDailyStat)
+class VisitorDailyStatAdmin(admin.ModelAdmin):
+    list_display = ('date', 'referer', 'visits', 'unique_sessions')
+    list_filter = ('date',)
+    search_fields = ('referer',)
+
+@admin.register(VisitorSession)
+class VisitorSessionAdmin(admin.ModelAdmin):
+    list_display = ('session_key', 'email', 'first_seen', 'last_seen', 'visits', 'referer', 'converted')
+    list_filter = ('converted', 'last_seen')
+    search_fields = ('session_key', 'email', 'referer')
+
+
+@admin.register(DailyBusinessStats)
+class DailyBusinessStatsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'business', 'bookings', 'completed', 'revenue', 'no_show_profit')
+    list_filter = ('date',)
+    search_fields = ('business__name',)
+
+@admin.register(DailyStaffStats)
+class DailyStaffStatsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'business', 'staff', 'bookings', 'completed', 'revenue')
+    list_filter = ('date',)
+    search_fields = ('business__name', 'staff__name')
+
+
+@admin.register(ClientStats)
+class ClientStatsAdmin(admin.ModelAdmin):
+    list_display = ('client', 'business', 'visit_count', 'last_visit_date', 'lifetime_value', 'deposits_collected')
+    search_fields = ('client__name', 'client__email', 'business__name')
+    raw_id_fields = ('client', 'favourite_service')
+
+
+@admin.register(WorkingHours)
+class WorkingHoursAdmin(admin.ModelAdmin):
+    list_display = ('business', 'staff', 'weekday', 'open_time', 'close_time')
+    list_filter = ('weekday',)
+    search_fields = ('business__name', 'staff__name')
+    raw_id_fields = ('business', 'staff')
+
+@admin.register(ScheduleOverride)
+class ScheduleOverrideAdmin(admin.ModelAdmin):
+    list_display = ('date', 'business', 'staff', 'open_time', 'close_time', 'reason')
+    list_filter = ('date',)
+    search_fields = ('business__name', 'staff__name', 'reason')
+    raw_id_fields = ('business', 'staff')
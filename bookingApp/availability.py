@@ -0,0 +1,113 @@
+"""
+Interval-index availability engine.
+
+Instead of re-scanning every appointment and staff block for every candidate
+slot, the busy picture for one day / staff member is built ONCE:
+- appointment + buffer ranges and staff blocks are merged into sorted,
+  non-overlapping ranges,
+- same-service group sessions are bucketed by start time (attendee totals),
+and each slot is then answered with a bisect.
+
+Every range is stored as the window of slot START times it forbids:
+a slot [t, t + duration) overlaps a busy range [a, b) exactly when
+a - duration < t < b. That keeps the per-slot check to a single lookup.
+"""
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+
+def merge_ranges(ranges):
+    """
+    Merges open (low, high) ranges into a sorted list of disjoint ranges.
+    Empty ranges (low >= high) are dropped.
+    """
+    merged = []
+    for low, high in sorted(r for r in ranges if r[0] < r[1]):
+        if merged and low < merged[-1][1]:
+            if high > merged[-1][1]:
+                merged[-1] = (merged[-1][0], high)
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def range_contains(merged, lows, value):
+    """True if `value` falls strictly inside one of the merged ranges."""
+    idx = bisect_left(lows, value) - 1
+    return idx >= 0 and value < merged[idx][1]
+
+
+class SlotIndex:
+    """
+    Busy-interval index for a single date (and optionally a single staff member).
+    Build it with `SlotIndex.build(...)`, then call `is_free(slot_start)` per slot.
+    """
+
+    def __init__(self, blocked, session_windows, sessions, max_capacity):
+        self.blocked = merge_ranges(blocked)
+        self.blocked_lows = [low for low, _ in self.blocked]
+        self.session_windows = merge_ranges(session_windows)
+        self.session_lows = [low for low, _ in self.session_windows]
+        # {session_start: (blocked_by_another_session, attendees)}
+        self.sessions = sessions
+        self.max_capacity = max_capacity
+
+    @classmethod
+    def build(cls, appointment_date, appointments, staff_blocks, buffer_delta,
+              service_duration, service_obj=None, max_capacity=1):
+        """
+        appointments: Appointment instances or named rows with the same attributes (see
+            utils.APPOINTMENT_SLOT_FIELDS) overlapping the date
+        staff_blocks: iterable of StaffBlock instances for the date
+        buffer_delta / service_duration: timedeltas used for every slot on this date
+        """
+        blocked = []
+        groups = {}
+
+        for appt in appointments:
+            appt_start = datetime.combine(appt.appointment_date, appt.appointment_start_time)
+            appt_end = appt_start + timedelta(minutes=appt.length_minutes)
+            window = (appt_start - buffer_delta - service_duration, appt_end + buffer_delta)
+
+            # Group Booking Logic: same service sessions only block OTHER start times
+            if service_obj and appt.service_id == service_obj.id:
+                groups.setdefault(appt_start, []).append((window, appt.attendees))
+            else:
+                blocked.append(window)
+
+        # Staff blocks carry no buffer
+        for block in staff_blocks:
+            b_start = datetime.combine(appointment_date, block.start_time)
+            b_end = datetime.combine(appointment_date, block.end_time)
+            blocked.append((b_start - service_duration, b_end))
+
+        session_windows = [window for members in groups.values() for window, _ in members]
+
+        sessions = {}
+        for start, members in groups.items():
+            blocked_by_other = any(
+                low < start < high
+                for other_start, other_members in groups.items() if other_start != start
+                for (low, high), _ in other_members
+            )
+            attendees = sum(count for (low, high), count in members if low < start < high)
+            sessions[start] = (blocked_by_other, attendees)
+
+        return cls(blocked, session_windows, sessions, max_capacity)
+
+    def is_free(self, slot_start, seats=1):
+        """slot_start: naive datetime on the indexed date. seats: attendees the booking needs."""
+        if range_contains(self.blocked, self.blocked_lows, slot_start):
+            return False
+
+        session = self.sessions.get(slot_start)
+        if session is None:
+            if range_contains(self.session_windows, self.session_lows, slot_start):
+                return False
+            attendees = 0
+        else:
+            blocked_by_other, attendees = session
+            if blocked_by_other:
+                return False
+
+        return attendees + seats <= self.max_capacity
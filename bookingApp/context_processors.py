@@ -1,5 +1,6 @@
 # bookingApp/context_processors.py
 from .models import Appointment, Staff
+from .utils import get_pending_count
 
 def pending_appointments_count(request):
     if not request.user.is_authenticated:
@@ -8,14 +9,14 @@ def pending_appointments_count(request):
     # Count as Owner
     biz_count = 0
     if hasattr(request.user, 'business'):
-        biz_count = Appointment.objects.filter(booking_form__business=request.user.business, status='pending').count()
+        biz_count = get_pending_count(business_id=request.user.business.id)
 
     # Count as Staff/Admin
     staff_count = 0
     if hasattr(request.user, 'staff_profile'):
-        staff_count = Appointment.objects.filter(booking_form__business=request.user.staff_profile.business, status='pending').count()
+        staff_count = get_pending_count(business_id=request.user.staff_profile.business_id)
 
     return {
         'pending_count': biz_count,
         'pending_staff_count': staff_count
-    }
\ No newline at end of file
+    }
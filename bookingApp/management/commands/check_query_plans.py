@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bookingApp.utils import explain_hot_queries
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the hot Appointment queries against the configured database "
+        "(MySQL or SQLite) and check that each one uses the composite index it was "
+        "designed for. Exits non-zero on a regression, so it can run in CI after migrate."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plan for every query')
+
+    def handle(self, *args, **options):
+        failures = []
+        for label, used, expected, plan in explain_hot_queries():
+            if used:
+                self.stdout.write(self.style.SUCCESS(f"OK    {label}: {used}"))
+            else:
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f"MISS  {label}: expected one of {', '.join(expected)}"))
+
+            if options['verbose_plans'] or not used:
+                self.stdout.write(f"      {plan}")
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries are not using their indexes: {', '.join(failures)}")
@@ -0,0 +1,45 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from bookingApp.utils import expire_unpaid_holds, single_instance_lock
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = (
+        "Cancel pending bookings whose deposit wasn't paid within DEPOSIT_HOLD_MINUTES, "
+        "for all businesses at once, and queue the cancellation emails in the outbox. "
+        "Run every minute from cron, or with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running, one pass every --interval seconds')
+        parser.add_argument('--interval', type=int, default=60, help='Seconds between passes in --loop mode (default 60)')
+
+    def handle(self, *args, **options):
+        with single_instance_lock('hold-expiry') as acquired:
+            if not acquired:
+                self.stdout.write(self.style.WARNING("Another hold-expiry worker is already running. Exiting."))
+                return
+
+            if not options['loop']:
+                expired = expire_unpaid_holds()
+                self.stdout.write(self.style.SUCCESS(f"Expired {expired} unpaid holds."))
+                return
+
+            interval = max(options['interval'], 1)
+            self.stdout.write(f"Hold-expiry worker started (every {interval}s).")
+            try:
+                while True:
+                    close_old_connections()
+                    try:
+                        expire_unpaid_holds()
+                    except Exception:
+                        # A single failed pass must not kill the worker
+                        logger.exception("expire_unpaid_holds failed")
+                    time.sleep(interval)
+            except KeyboardInterrupt:
+                self.stdout.write("Hold-expiry worker stopped.")
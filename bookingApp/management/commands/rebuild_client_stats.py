@@ -0,0 +1,26 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from bookingApp.utils import rebuild_client_stats, single_instance_lock
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the ClientStats rows behind the client list. Signals keep them "
+        "current; run nightly to reconcile, and once after migrating to backfill."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--business', type=int, action='append', dest='business_ids', help='Limit to a business id (repeatable)')
+
+    def handle(self, *args, **options):
+        with single_instance_lock('client-stats') as acquired:
+            if not acquired:
+                self.stdout.write(self.style.WARNING("Another client stats rebuild is already running. Exiting."))
+                return
+
+            total = rebuild_client_stats(business_ids=options['business_ids'])
+            logger.info(f"Rebuilt stats for {total} clients")
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {total} clients."))
@@ -0,0 +1,39 @@
+import logging
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bookingApp.utils import rebuild_daily_stats, single_instance_lock
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the DailyBusinessStats/DailyStaffStats rollups behind the analytics "
+        "dashboard. Signals keep them current; run nightly to reconcile anything that "
+        "slipped past them, or with a large --days (or --since) once to backfill."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help='Local days back from today to recompute (default 2)')
+        parser.add_argument('--since', type=str, default=None, help='Recompute from this date (YYYY-MM-DD) instead of --days')
+        parser.add_argument('--ahead', type=int, default=90, help='Also recompute this many future days (default 90)')
+        parser.add_argument('--business', type=int, action='append', dest='business_ids', help='Limit to a business id (repeatable)')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['since']:
+            start_date = date.fromisoformat(options['since'])
+        else:
+            start_date = today - timedelta(days=options['days'])
+        end_date = today + timedelta(days=options['ahead'])
+
+        with single_instance_lock('daily-stats') as acquired:
+            if not acquired:
+                self.stdout.write(self.style.WARNING("Another daily stats rebuild is already running. Exiting."))
+                return
+
+            days = rebuild_daily_stats(start_date, end_date, business_ids=options['business_ids'])
+            logger.info(f"Rebuilt {days} business days of stats ({start_date} to {end_date})")
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {days} business days of stats ({start_date} to {end_date})."))
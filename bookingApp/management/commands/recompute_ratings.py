@@ -0,0 +1,28 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from bookingApp.utils import recompute_business_ratings, single_instance_lock
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Business.rating_sum/rating_count/rating_avg from the reviews table. "
+        "Review signals keep them current; run after migrating to backfill, or to repair "
+        "drift from bulk edits that skipped the signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--business', type=int, action='append', dest='business_ids', help='Limit to a business id (repeatable)')
+
+    def handle(self, *args, **options):
+        with single_instance_lock('recompute-ratings') as acquired:
+            if not acquired:
+                self.stdout.write(self.style.WARNING("Another rating recompute is already running. Exiting."))
+                return
+
+            fixed = recompute_business_ratings(business_ids=options['business_ids'])
+            if fixed:
+                logger.warning(f"Corrected rating aggregates for {fixed} businesses")
+            self.stdout.write(self.style.SUCCESS(f"Corrected rating aggregates for {fixed} businesses."))
@@ -0,0 +1,32 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from bookingApp.utils import rollup_visitor_logs, single_instance_lock
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = (
+        "Roll raw landing-page VisitorLog rows up into daily per-referer counts and "
+        "per-session funnel rows, then prune raw rows older than the retention window. "
+        "Run daily; use a large --days once to backfill."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help='Local days to (re)compute, including today (default 2)')
+        parser.add_argument('--retention-days', type=int, default=None, help='Keep raw rows this many days (default VISITOR_LOG_RETENTION_DAYS)')
+
+    def handle(self, *args, **options):
+        with single_instance_lock('visitor-rollup') as acquired:
+            if not acquired:
+                self.stdout.write(self.style.WARNING("Another visitor rollup is already running. Exiting."))
+                return
+
+            result = rollup_visitor_logs(days=options['days'], retention_days=options['retention_days'])
+            logger.info(f"Visitor rollup: {result}")
+            self.stdout.write(self.style.SUCCESS(
+                f"Daily rows: {result['daily_rows']}, sessions created: {result['sessions_created']}, "
+                f"updated: {result['sessions_updated']}, newly converted: {result['converted']}, "
+                f"raw rows pruned: {result['pruned']}."
+            ))
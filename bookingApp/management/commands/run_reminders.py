@@ -1,21 +1,56 @@
-from django.core.management.base import BaseCommand
-from bookingApp.utils import trigger_pending_reminders
 import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from bookingApp.utils import trigger_pending_reminders, reconcile_pending_counts, single_instance_lock
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
-    help = "Send appointment reminders (24h and 2h) and run auto-complete logic."
+    help = (
+        "Send appointment reminders (24h and 2h), run auto-complete logic and "
+        "reconcile the cached pending-appointment counters. "
+        "Run once from cron, or with --loop as a long-running scheduler. "
+        "A lock ensures only one instance runs at a time."
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument('--window', type=int, default=5, help='Window size in minutes (default 5)')
+        parser.add_argument('--loop', action='store_true', help='Keep running, one pass every --interval seconds')
+        parser.add_argument('--interval', type=int, default=300, help='Seconds between passes in --loop mode (default 300)')
 
     def handle(self, *args, **options):
-        window = options['window']
-        logger.info("Running trigger_pending_reminders with window %s minutes", window)
+        with single_instance_lock('reminders') as acquired:
+            if not acquired:
+                self.stdout.write(self.style.WARNING("Another reminder worker is already running. Exiting."))
+                return
+
+            if not options['loop']:
+                self.run_once(reraise=True)
+                return
+
+            interval = max(options['interval'], 1)
+            self.stdout.write(f"Reminder scheduler started (every {interval}s).")
+            try:
+                while True:
+                    self.run_once()
+                    time.sleep(interval)
+            except KeyboardInterrupt:
+                self.stdout.write("Reminder scheduler stopped.")
+
+    def run_once(self, reraise=False):
+        # Long-running loops must not hold on to dead MySQL connections
+        close_old_connections()
+        logger.info("Running trigger_pending_reminders")
         try:
-            trigger_pending_reminders(window_minutes=window)
+            trigger_pending_reminders()
             logger.info("trigger_pending_reminders completed")
-        except Exception as e:
-            logger.exception("trigger_pending_reminders failed: %s", e)
-            raise
\ No newline at end of file
+            reconcile_pending_counts()
+        except Exception:
+            logger.exception("trigger_pending_reminders failed")
+            # In --loop mode a single failed pass must not kill the scheduler
+            if reraise:
+                raise
+        finally:
+            close_old_connections()
\ No newline at end of file
@@ -0,0 +1,60 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from bookingApp.utils import drain_email_outbox, single_instance_lock
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued emails from the EmailOutbox table over one SMTP connection per batch. "
+        "Failed sends are retried with exponential backoff. "
+        "Run once from cron, or with --loop as a long-running worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running, one pass every --interval seconds')
+        parser.add_argument('--interval', type=int, default=15, help='Seconds between passes in --loop mode (default 15)')
+        parser.add_argument('--batch-size', type=int, default=None, help='Emails per batch (default EMAIL_OUTBOX_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        with single_instance_lock('outbox') as acquired:
+            if not acquired:
+                self.stdout.write(self.style.WARNING("Another outbox worker is already running. Exiting."))
+                return
+
+            batch_size = options['batch_size']
+            if not options['loop']:
+                # Drain everything that is currently due, batch by batch
+                while self.run_once(batch_size):
+                    pass
+                return
+
+            interval = max(options['interval'], 1)
+            self.stdout.write(f"Outbox worker started (every {interval}s).")
+            try:
+                while True:
+                    if not self.run_once(batch_size):
+                        time.sleep(interval)
+            except KeyboardInterrupt:
+                self.stdout.write("Outbox worker stopped.")
+
+    def run_once(self, batch_size):
+        """Sends one batch. Returns True if it delivered mail without errors (more may be waiting)."""
+        close_old_connections()
+        try:
+            sent, failed = drain_email_outbox(batch_size)
+        except Exception:
+            logger.exception("drain_email_outbox failed")
+            return False
+        finally:
+            close_old_connections()
+
+        if sent or failed:
+            style = self.style.SUCCESS if not failed else self.style.WARNING
+            self.stdout.write(style(f"Outbox batch: {sent} sent, {failed} failed."))
+        # Stop early when the batch had failures so a dead SMTP server isn't hammered
+        return sent > 0 and failed == 0
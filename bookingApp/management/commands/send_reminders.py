@@ -4,5 +4,10 @@ from bookingApp.utils import send_subscription_expiry_reminders
 class Command(BaseCommand):
     help = 'Sends subscription expiry reminders'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Emails per SMTP connection (default EMAIL_BATCH_SIZE)')
+
     def handle(self, *args, **options):
-        send_subscription_expiry_reminders()
\ No newline at end of file
+        sent, failed = send_subscription_expiry_reminders(batch_size=options['batch_size'])
+        style = self.style.SUCCESS if not failed else self.style.WARNING
+        self.stdout.write(style(f"Subscription expiry reminders: {sent} sent, {failed} failed."))
\ No newline at end of file
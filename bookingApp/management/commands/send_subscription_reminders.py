@@ -10,12 +10,16 @@ from django.utils.html import strip_tags
 
 # Import your Business model
 from bookingApp.models import Business 
+from bookingApp.utils import send_email_batches
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
     help = 'Sends subscription expiration reminders: 2 days prior and on the day of expiration.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Emails per SMTP connection (default EMAIL_BATCH_SIZE)')
+
     def handle(self, *args, **options):
         # 1. Setup Dates
         now = timezone.now()
@@ -33,10 +37,7 @@ class Command(BaseCommand):
             owner__email__isnull=False
         ).select_related('owner')
 
-        count_2_days = 0
-        for biz in businesses_2_days:
-            if self.send_reminder_email(biz, days_left=2):
-                count_2_days += 1
+        count_2_days = self.send_reminders(businesses_2_days, days_left=2, batch_size=options['batch_size'])
 
         if count_2_days > 0:
             self.stdout.write(self.style.SUCCESS(f"Sent '2 Days Left' reminders to {count_2_days} businesses."))
@@ -52,19 +53,39 @@ class Command(BaseCommand):
             owner__email__isnull=False
         ).select_related('owner')
 
-        count_today = 0
-        for biz in businesses_expiring_today:
-            if self.send_reminder_email(biz, days_left=0):
-                count_today += 1
+        count_today = self.send_reminders(businesses_expiring_today, days_left=0, batch_size=options['batch_size'])
 
         if count_today > 0:
             self.stdout.write(self.style.SUCCESS(f"Sent 'Expiring Today' reminders to {count_today} businesses."))
         else:
             self.stdout.write("No businesses found expiring today.")
 
-    def send_reminder_email(self, business, days_left):
+    def send_reminders(self, businesses, days_left, batch_size=None):
+        """
+        Builds every reminder first, then sends them in batches over one SMTP
+        connection per batch. Returns the number sent.
+        """
+        messages = []
+        for biz in businesses:
+            msg = self.build_reminder_email(biz, days_left)
+            if msg:
+                messages.append((biz.id, msg))
+
+        if not messages:
+            return 0
+
+        def report(batch_no, sent, failed):
+            style = self.style.SUCCESS if not failed else self.style.WARNING
+            self.stdout.write(style(f"  Batch {batch_no}: {sent} sent, {failed} failed"))
+
+        sent_ids, failed = send_email_batches(messages, batch_size, label="Subscription reminders", report=report)
+        for biz_id, error in failed:
+            self.stdout.write(self.style.ERROR(f"Failed to send to business {biz_id}: {error}"))
+        return len(sent_ids)
+
+    def build_reminder_email(self, business, days_left):
         """
-        Renders the HTML template and sends the multi-part email.
+        Renders the HTML template and builds the multi-part email.
         """
         try:
             # Construct renewal URL (make sure SITE_URL is in your settings.py)
@@ -97,12 +118,9 @@ class Command(BaseCommand):
                 [business.owner.email]
             )
             msg.attach_alternative(html_content, "text/html")
-            
-            # Send
-            msg.send(fail_silently=False)
-            return True
+            return msg
 
         except Exception as e:
-            logger.error(f"Error sending email to {business.name}: {e}")
-            self.stdout.write(self.style.ERROR(f"Failed to send to {business.name}: {e}"))
-            return False
\ No newline at end of file
+            logger.error(f"Error building email for {business.name}: {e}")
+            self.stdout.write(self.style.ERROR(f"Failed to build email for {business.name}: {e}"))
+            return None
\ No newline at end of file
@@ -1,5 +1,6 @@
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils import timezone
 
 class StaffActiveMiddleware:
     def __init__(self, get_response):
@@ -26,33 +27,128 @@ class StaffActiveMiddleware:
 
         return self.get_response(request)
 
-from .models import VisitorLog
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import connection
 
 from .models import VisitorLog
 
+logger = logging.getLogger(__name__)
+
+
+class VisitorLogBuffer:
+    """
+    In-process buffer of landing-page hits, written with one bulk_create by a
+    background thread every `max_age` seconds (sooner once `max_size` entries
+    are waiting), and once more at shutdown. Requests only append to a list.
+
+    Entries keep a reference to the request's session rather than its key: for a
+    first-time visitor the key only exists after SessionMiddleware saves the
+    session on the way out, so it is resolved at flush time instead.
+
+    Loss window: the atexit flush covers normal worker exits (including
+    max_requests recycling), but a worker that is SIGKILLed or hard-timed-out
+    drops whatever is still buffered: at most `max_size` hits or `max_age`
+    seconds of traffic for that process.
+    """
+
+    def __init__(self, max_size, max_age):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._pending = []
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def add(self, session, **fields):
+        with self._lock:
+            self._pending.append((session, fields, False))
+            full = len(self._pending) >= self.max_size
+            self._ensure_flusher()
+        if full:
+            self._wake.set()
+
+    def _ensure_flusher(self):
+        # Started lazily and once per process: a thread started before a
+        # pre-fork (gunicorn --preload) does not exist in the workers.
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='visitor-log-flusher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.max_age)
+            self._wake.clear()
+            try:
+                self.flush()
+            finally:
+                # This thread's own connection; don't hold it open between flushes
+                connection.close()
+
+    def flush(self, final=False):
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        rows, retry = [], []
+        for session, fields, retried in pending:
+            if session.session_key:
+                rows.append(VisitorLog(session_key=session.session_key, **fields))
+            elif not (final or retried):
+                # Session not saved yet (request still finishing): try next flush
+                retry.append((session, fields, True))
+
+        if retry:
+            with self._lock:
+                self._pending[:0] = retry
+
+        if rows:
+            try:
+                VisitorLog.objects.bulk_create(rows, batch_size=500)
+            except Exception:
+                logger.exception(f"Failed to write {len(rows)} visitor logs")
+
+
+visitor_log_buffer = VisitorLogBuffer(
+    max_size=getattr(settings, 'VISITOR_LOG_BUFFER_SIZE', 50),
+    max_age=getattr(settings, 'VISITOR_LOG_FLUSH_SECONDS', 30),
+)
+atexit.register(visitor_log_buffer.flush, final=True)
+
+
 class VisitorTrackingMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
+        response = self.get_response(request)
+
         # STRICT CHECK: Only log if the path is exactly '/'
         # This ignores /admin/, /api/, and business-specific slugs
         if request.path == "/" and request.method == "GET":
 
-            # Ensure session exists to track the user across the site later
+            # Ensure session exists to track the user across the site later.
+            # Marking it is enough: SessionMiddleware saves it with the response.
             if not request.session.session_key:
-                request.session.create()
+                request.session['visitor_tracked'] = True
 
-            VisitorLog.objects.create(
+            visitor_log_buffer.add(
+                request.session,
                 user=request.user if request.user.is_authenticated else None,
-                session_key=request.session.session_key,
                 ip_address=self.get_client_ip(request),
                 user_agent=request.META.get('HTTP_USER_AGENT'),
                 path=request.path,
-                referer=request.META.get('HTTP_REFERER')
+                referer=request.META.get('HTTP_REFERER'),
+                timestamp=timezone.now(),
             )
 
-        return self.get_response(request)
+        return response
 
     def get_client_ip(self, request):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 09:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0043_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='visitorlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
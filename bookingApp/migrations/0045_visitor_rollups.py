@@ -0,0 +1,59 @@
+# Generated by Django 6.0 on 2026-10-18 10:00
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0044_visitorlog_timestamp_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitorDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('referer', models.CharField(blank=True, max_length=200)),
+                ('visits', models.PositiveIntegerField(default=0)),
+                ('unique_sessions', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-date', '-visits'],
+            },
+        ),
+        migrations.CreateModel(
+            name='VisitorSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=40, unique=True)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+                ('visits', models.PositiveIntegerField(default=0)),
+                ('referer', models.CharField(blank=True, max_length=200)),
+                ('email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('converted', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='visitorlog',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='clientprofile',
+            index=models.Index(fields=['email'], name='clientprofile_email_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='visitordailystat',
+            unique_together={('date', 'referer')},
+        ),
+        migrations.AddIndex(
+            model_name='visitorsession',
+            index=models.Index(fields=['converted', 'last_seen'], name='visitor_session_funnel_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 10:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_business(apps, schema_editor):
+    """Same precedence as Appointment.resolve_business_id: booking form, then service, then staff."""
+    Appointment = apps.get_model('bookingApp', 'Appointment')
+    sources = [
+        ('booking_form', apps.get_model('bookingApp', 'BookingForm')),
+        ('service', apps.get_model('bookingApp', 'Service')),
+        ('staff', apps.get_model('bookingApp', 'Staff')),
+    ]
+    for field, model in sources:
+        Appointment.objects.filter(business__isnull=True, **{f'{field}__isnull': False}).update(
+            business=Subquery(model.objects.filter(pk=OuterRef(f'{field}_id')).values('business_id')[:1])
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0045_visitor_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='business',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='appointments', to='bookingApp.business'),
+        ),
+        migrations.RunPython(backfill_business, reverse_code=migrations.RunPython.noop),
+    ]
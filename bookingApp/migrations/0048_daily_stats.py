@@ -0,0 +1,107 @@
+# Generated by Django 6.0 on 2026-10-18 11:30
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _empty_day():
+    return {
+        'bookings': 0, 'completed': 0, 'revenue': Decimal('0'), 'no_show_profit': Decimal('0'),
+        'hourly': defaultdict(int), 'services': {},
+    }
+
+
+def _add_to_day(day, row):
+    # Frozen copy of utils._add_to_day as of this migration
+    price = row['service__price'] or Decimal('0')
+    day['bookings'] += 1
+    day['hourly'][str(row['appointment_start_time'].hour)] += 1
+
+    service = day['services'].setdefault(row['service__name'] or '', {'count': 0, 'revenue': 0.0})
+    service['count'] += 1
+
+    if row['status'] == 'completed':
+        day['completed'] += 1
+        day['revenue'] += price
+        service['revenue'] += float(price)
+    elif row['status'] == 'cancelled' and row['deposit_paid']:
+        day['no_show_profit'] += row['amount_to_pay'] or Decimal('0')
+
+
+def backfill_daily_stats(apps, schema_editor):
+    """Rolls up every existing appointment, one business at a time."""
+    Appointment = apps.get_model('bookingApp', 'Appointment')
+    DailyBusinessStats = apps.get_model('bookingApp', 'DailyBusinessStats')
+    DailyStaffStats = apps.get_model('bookingApp', 'DailyStaffStats')
+
+    business_ids = Appointment.objects.exclude(business=None).order_by().values_list('business_id', flat=True).distinct()
+    for business_id in list(business_ids):
+        business_days = defaultdict(_empty_day)
+        staff_days = defaultdict(_empty_day)
+        rows = Appointment.objects.filter(business_id=business_id).order_by().values(
+            'appointment_date', 'appointment_start_time', 'status', 'deposit_paid', 'amount_to_pay',
+            'staff_id', 'service__name', 'service__price',
+        )
+        for row in rows.iterator(chunk_size=2000):
+            _add_to_day(business_days[row['appointment_date']], row)
+            if row['staff_id']:
+                _add_to_day(staff_days[(row['staff_id'], row['appointment_date'])], row)
+
+        DailyBusinessStats.objects.bulk_create([
+            DailyBusinessStats(business_id=business_id, date=day, **values)
+            for day, values in business_days.items()
+        ], batch_size=500)
+        DailyStaffStats.objects.bulk_create([
+            DailyStaffStats(business_id=business_id, staff_id=staff_id, date=day, **values)
+            for (staff_id, day), values in staff_days.items()
+        ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0047_appointment_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBusinessStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('bookings', models.PositiveIntegerField(default=0)),
+                ('completed', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('no_show_profit', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('hourly', models.JSONField(default=dict)),
+                ('services', models.JSONField(default=dict)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='bookingApp.business')),
+            ],
+            options={
+                'unique_together': {('business', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyStaffStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('bookings', models.PositiveIntegerField(default=0)),
+                ('completed', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('no_show_profit', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('hourly', models.JSONField(default=dict)),
+                ('services', models.JSONField(default=dict)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_staff_stats', to='bookingApp.business')),
+                ('staff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='bookingApp.staff')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['business', 'date'], name='dailystaffstats_biz_date_idx')],
+                'unique_together': {('staff', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, reverse_code=migrations.RunPython.noop),
+    ]
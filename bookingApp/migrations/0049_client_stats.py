@@ -0,0 +1,80 @@
+# Generated by Django 6.0 on 2026-10-18 13:10
+
+from collections import Counter
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def backfill_client_stats(apps, schema_editor):
+    """
+    Same rules as utils.refresh_client_stats at the time of this migration: an
+    appointment counts for a client when its guest_email or its customer's email
+    matches, and only completed ones add visits and value.
+    """
+    Appointment = apps.get_model('bookingApp', 'Appointment')
+    ClientProfile = apps.get_model('bookingApp', 'ClientProfile')
+    ClientStats = apps.get_model('bookingApp', 'ClientStats')
+
+    profiles = ClientProfile.objects.exclude(email=None).exclude(email='').order_by()
+    for business_id in list(profiles.values_list('business_id', flat=True).distinct()):
+        clients = dict(profiles.filter(business_id=business_id).values_list('email', 'id'))
+        totals = {email: {'visit_count': 0, 'last_visit_date': None, 'lifetime_value': Decimal('0'),
+                          'deposits_collected': Decimal('0'), 'services': Counter()} for email in clients}
+        rows = Appointment.objects.filter(business_id=business_id).filter(
+            Q(guest_email__in=clients) | Q(customer__email__in=clients)
+        ).order_by().values(
+            'guest_email', 'customer__email', 'status', 'appointment_date',
+            'deposit_paid', 'amount_to_pay', 'service_id', 'service__price',
+        )
+        for row in rows.iterator(chunk_size=2000):
+            for email in {row['guest_email'], row['customer__email']} & clients.keys():
+                client = totals[email]
+                if row['service_id']:
+                    client['services'][row['service_id']] += 1
+                if row['status'] != 'completed':
+                    continue
+                client['visit_count'] += 1
+                client['lifetime_value'] += row['service__price'] or Decimal('0')
+                if row['deposit_paid']:
+                    client['deposits_collected'] += row['amount_to_pay'] or Decimal('0')
+                if not client['last_visit_date'] or row['appointment_date'] > client['last_visit_date']:
+                    client['last_visit_date'] = row['appointment_date']
+
+        stats = []
+        for email, client in totals.items():
+            favourite = client.pop('services').most_common(1)
+            stats.append(ClientStats(
+                client_id=clients[email], business_id=business_id,
+                favourite_service_id=favourite[0][0] if favourite else None, **client,
+            ))
+        ClientStats.objects.bulk_create(stats, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0048_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientStats',
+            fields=[
+                ('client', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='bookingApp.clientprofile')),
+                ('visit_count', models.PositiveIntegerField(default=0)),
+                ('last_visit_date', models.DateField(blank=True, null=True)),
+                ('lifetime_value', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('deposits_collected', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='client_stats', to='bookingApp.business')),
+                ('favourite_service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='bookingApp.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['business', 'lifetime_value'], name='clientstats_biz_ltv_idx'), models.Index(fields=['business', 'last_visit_date'], name='clientstats_biz_last_idx'), models.Index(fields=['business', 'visit_count'], name='clientstats_biz_visits_idx'), models.Index(fields=['business', 'deposits_collected'], name='clientstats_biz_dep_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_client_stats, reverse_code=migrations.RunPython.noop),
+    ]
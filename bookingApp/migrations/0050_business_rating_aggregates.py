@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-18 14:05
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    Business = apps.get_model('bookingApp', 'Business')
+    Review = apps.get_model('bookingApp', 'Review')
+    rows = Review.objects.order_by().values('business_id').annotate(rating_sum=Sum('rating'), rating_count=Count('id'))
+    for row in rows:
+        Business.objects.filter(pk=row['business_id']).update(
+            rating_sum=row['rating_sum'],
+            rating_count=row['rating_count'],
+            rating_avg=round(row['rating_sum'] / row['rating_count'], 2),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0049_client_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='business',
+            name='rating_avg',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='business',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='business',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_ratings, reverse_code=migrations.RunPython.noop),
+    ]
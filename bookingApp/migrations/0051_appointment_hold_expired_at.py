@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0050_business_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='hold_expired_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-18 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0051_appointment_hold_expired_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_ledgers', to='bookingApp.business')),
+            ],
+            options={
+                'unique_together': {('business', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-18 16:30
+
+from datetime import datetime, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_ends_at(apps, schema_editor):
+    Appointment = apps.get_model('bookingApp', 'Appointment')
+    rows = Appointment.objects.filter(ends_at__isnull=True).only(
+        'id', 'appointment_date', 'appointment_start_time', 'length_minutes'
+    )
+    batch = []
+    for appt in rows.iterator(chunk_size=2000):
+        start = timezone.make_aware(datetime.combine(appt.appointment_date, appt.appointment_start_time))
+        appt.ends_at = start + timedelta(minutes=appt.length_minutes)
+        batch.append(appt)
+        if len(batch) >= 2000:
+            Appointment.objects.bulk_update(batch, ['ends_at'])
+            batch = []
+    if batch:
+        Appointment.objects.bulk_update(batch, ['ends_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0053_weekly_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_ends_at, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-18 17:10
+
+from datetime import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_starts_at(apps, schema_editor):
+    Appointment = apps.get_model('bookingApp', 'Appointment')
+    rows = Appointment.objects.filter(starts_at__isnull=True).only(
+        'id', 'appointment_date', 'appointment_start_time'
+    )
+    batch = []
+    for appt in rows.iterator(chunk_size=2000):
+        appt.starts_at = timezone.make_aware(datetime.combine(appt.appointment_date, appt.appointment_start_time))
+        batch.append(appt)
+        if len(batch) >= 2000:
+            Appointment.objects.bulk_update(batch, ['starts_at'])
+            batch = []
+    if batch:
+        Appointment.objects.bulk_update(batch, ['starts_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0054_appointment_ends_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_starts_at, reverse_code=migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['business', 'starts_at', 'ends_at'], name='appt_business_span_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['staff', 'starts_at', 'ends_at'], name='appt_staff_span_idx'),
+        ),
+    ]
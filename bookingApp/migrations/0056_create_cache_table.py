@@ -0,0 +1,20 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # The default cache is a DatabaseCache (see CACHES in settings); its table is
+    # not a model, so create it here rather than relying on a separate
+    # `manage.py createcachetable` step. A no-op for other backends or if it exists.
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookingApp', '0055_appointment_span_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, reverse_code=migrations.RunPython.noop),
+    ]
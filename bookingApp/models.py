@@ -208,6 +208,15 @@ class Business(models.Model):
     )
     last_active = models.DateTimeField(default=timezone.now, null=True, blank=True)
 
+    # --- Rating Aggregates ---
+    # Maintained by the Review signals with F() updates (see utils.apply_rating_change);
+    # the business instance a review carries is refreshed afterwards so a later save() keeps them.
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False, db_index=True)
+
+    RATING_FIELDS = ('rating_sum', 'rating_count', 'rating_avg')
+
     def save(self, *args, **kwargs):
         # 1. Handle Slug Generation
         if not self.slug:
@@ -293,12 +302,12 @@ class Business(models.Model):
 
     @property
     def average_rating(self):
-        avg = self.reviews.aggregate(Avg('rating'))['rating__avg']
-        return round(avg, 1) if avg else 0.0
+        # From the exact totals: rounding the 2-dp rating_avg again can be off by 0.1
+        return round(self.rating_sum / self.rating_count, 1) if self.rating_count else 0.0
 
     @property
     def review_count(self):
-        return self.reviews.count()
+        return self.rating_count
 
     @property
     def is_active(self):
@@ -436,6 +445,12 @@ from django.db import models
 from django.conf import settings
 from django.utils.http import urlencode
 
+class AppointmentQuerySet(models.QuerySet):
+    def for_business(self, business):
+        """Tenant scope: every appointment of a business, via the denormalized FK."""
+        return self.filter(business=business)
+
+
 class Appointment(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -446,12 +461,17 @@ class Appointment(models.Model):
         ('cancelled', 'Cancelled'),
     ]
 
+    # Denormalized from booking_form / service / staff on save so tenant queries hit one indexed column
+    # No standalone index: the composite indexes in Meta all lead with business
+    business = models.ForeignKey('Business', on_delete=models.CASCADE, related_name='appointments', null=True, blank=True, editable=False, db_index=False)
     booking_form = models.ForeignKey('BookingForm', on_delete=models.CASCADE, related_name='appointments', null=True, blank=True)
     customer = models.ForeignKey('ClientProfile', on_delete=models.CASCADE, related_name='appointments', null=True, blank=True)
 
     deposit_paid = models.BooleanField(default=False)
     amount_to_pay = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     payfast_reference = models.CharField(max_length=100, blank=True, null=True)
+    # Set when the expire_holds job cancelled the booking for an unpaid deposit
+    hold_expired_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     reminder_24h_sent = models.BooleanField(default=False)
     reminder_2h_sent = models.BooleanField(default=False)
@@ -464,10 +484,16 @@ class Appointment(models.Model):
 
     service = models.ForeignKey('Service', on_delete=models.SET_NULL, null=True)
     staff = models.ForeignKey('Staff', on_delete=models.CASCADE, related_name='appointments', null=True, blank=True)
+    # Duration snapshot taken when the booking is made (or its service changes), so
+    # editing a service doesn't rewrite the length of bookings already in the diary
     length_minutes = models.PositiveIntegerField(editable=False)
 
     appointment_date = models.DateField()
     appointment_start_time = models.TimeField()
+    # Aware start / start + length_minutes, kept in sync by save(); availability
+    # fetches only the bookings overlapping the opening hours with a range filter on these
+    starts_at = models.DateTimeField(null=True, blank=True, editable=False)
+    ends_at = models.DateTimeField(null=True, blank=True, editable=False)
     notes = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=25, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -478,8 +504,24 @@ class Appointment(models.Model):
         editable=False
     )
 
+    objects = AppointmentQuerySet.as_manager()
+
     class Meta:
         ordering = ['-appointment_date', '-appointment_start_time']
+        # Matched to the hot queries; `manage.py check_query_plans` verifies they are used
+        indexes = [
+            # owner dashboard, master view, analytics
+            models.Index(fields=['business', 'appointment_date', 'appointment_start_time'], name='appt_business_date_idx'),
+            # staff dashboard, analytics staff filter
+            models.Index(fields=['staff', 'appointment_date', 'appointment_start_time'], name='appt_staff_date_idx'),
+            # availability conflict prefilter (starts_at < window end, ends_at > window start)
+            models.Index(fields=['business', 'starts_at', 'ends_at'], name='appt_business_span_idx'),
+            models.Index(fields=['staff', 'starts_at', 'ends_at'], name='appt_staff_span_idx'),
+            # pending counters (context processor, notification badges)
+            models.Index(fields=['business', 'status'], name='appt_business_status_idx'),
+            # reminders and auto-completion sweeps
+            models.Index(fields=['status', 'appointment_date'], name='appt_status_date_idx'),
+        ]
 
     # --- WhatsApp Logic ---
     @property
@@ -525,22 +567,65 @@ class Appointment(models.Model):
         start_dt = datetime.combine(self.appointment_date, self.appointment_start_time)
         return (start_dt + timedelta(minutes=self.length_minutes)).time()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets save() tell a service change apart from a plain re-save
+        instance._loaded_service_id = instance.__dict__.get('service_id', models.DEFERRED)
+        return instance
+
+    def compute_starts_at(self):
+        """Aware start datetime from the local wall-clock date and start time."""
+        return timezone.make_aware(datetime.combine(self.appointment_date, self.appointment_start_time))
+
+    def compute_ends_at(self):
+        """Aware end datetime: compute_starts_at() + length_minutes."""
+        return self.compute_starts_at() + timedelta(minutes=self.length_minutes)
+
     # models.py inside the Appointment class
 
     # Inside Appointment class in models.py
+    def resolve_business_id(self):
+        """Owning business, from the booking form, else the service, else the staff member."""
+        for relation in ('booking_form', 'service', 'staff'):
+            if getattr(self, f'{relation}_id'):
+                return getattr(self, relation).business_id
+        return None
+
     def save(self, *args, **kwargs):
+        if not self.business_id:
+            self.business_id = self.resolve_business_id()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and self.business_id:
+                kwargs['update_fields'] = {*update_fields, 'business'}
+
+        loaded_service_id = getattr(self, '_loaded_service_id', None)
+        service_changed = (
+            self._state.adding or loaded_service_id is None
+            or (loaded_service_id is not models.DEFERRED and loaded_service_id != self.service_id)
+        )
+
         if self.service:
-            self.length_minutes = self.service.default_length_minutes
+            if service_changed or not self.length_minutes:
+                self.length_minutes = self.service.default_length_minutes
 
             # Ensure we capture the deposit amount at the MOMENT of booking
             if not self.amount_to_pay or self.amount_to_pay == 0:
                 # Check if we have a business via the service
                 business = self.service.business
                 self.amount_to_pay = business.calculate_deposit(self.service.price)
-        else:
+        elif not self.length_minutes:
             self.length_minutes = 30
 
+        if self.appointment_date and self.appointment_start_time:
+            self.starts_at = self.compute_starts_at()
+            self.ends_at = self.compute_ends_at()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'appointment_date', 'appointment_start_time', 'service'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'length_minutes', 'starts_at', 'ends_at'}
+
         super().save(*args, **kwargs)
+        self._loaded_service_id = self.service_id
 
     def __str__(self):
         display_name = "Guest"
@@ -692,6 +777,10 @@ class ClientProfile(models.Model):
     class Meta:
         unique_together = ('business', 'email')
         ordering = ['name']
+        indexes = [
+            # Email-only lookups (visitor conversion anti-joins)
+            models.Index(fields=['email'], name='clientprofile_email_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.business.name}"
@@ -699,18 +788,24 @@ class ClientProfile(models.Model):
     def get_appointments(self):
         """Standardizes finding all appointments for this client email at this business."""
         from .models import Appointment
-        return Appointment.objects.filter(
-            Q(guest_email=self.email) | Q(customer__email=self.email),
-            service__business=self.business
+        return Appointment.objects.for_business(self.business_id).filter(
+            Q(guest_email=self.email) | Q(customer__email=self.email)
         )
 
+    # Every metric below is one query per call. utils.load_client_metrics fills
+    # `_metrics` for a whole list of clients in two queries; the properties use it when set.
+
     @property
     def appointment_count(self):
+        if hasattr(self, '_metrics'):
+            return self._metrics['appointment_count']
         return self.get_appointments().count()
 
     @property
     def total_deposit_paid(self):
         # NEW: Total Deposits Collected
+        if hasattr(self, '_metrics'):
+            return self._metrics['total_deposit_paid']
         return self.get_appointments().filter(status='completed').aggregate(
             total=Sum('amount_to_pay')
         )['total'] or 0.00
@@ -719,13 +814,23 @@ class ClientProfile(models.Model):
     def total_spent(self):
         # FIX: Filter for completed appointments only, and sum service__price (Full Value)
         # instead of amount_to_pay (Deposit only).
+        if hasattr(self, '_metrics'):
+            return self._metrics['total_spent']
         return self.get_appointments().filter(status='completed').aggregate(
             total=Sum('service__price')
         )['total'] or 0.00
 
+    @property
+    def recent_appointments(self):
+        """Latest appointments first (with service loaded); capped at 10 unless preloaded."""
+        if hasattr(self, '_metrics'):
+            return self._metrics['recent_appointments']
+        return list(self.get_appointments().select_related('service').order_by(
+            '-appointment_date', '-appointment_start_time', '-id')[:10])
+
     @property
     def last_service(self):
-        apt = self.get_appointments().order_by('-appointment_date', '-appointment_start_time').first()
+        apt = self.last_visit_appointment
         return apt.service.name if apt and apt.service else "N/A"
 
     # inside class ClientProfile(models.Model):
@@ -733,7 +838,8 @@ class ClientProfile(models.Model):
     @property
     def last_visit_appointment(self):
         """Returns the most recent appointment object for this client."""
-        return self.get_appointments().order_by('-appointment_date', '-appointment_start_time').first()
+        recent = self.recent_appointments
+        return recent[0] if recent else None
 
     @property
     def last_visit_display(self):
@@ -747,6 +853,8 @@ class ClientProfile(models.Model):
 
     @property
     def most_selected_service(self):
+        if hasattr(self, '_metrics'):
+            return self._metrics['most_selected_service']
         service_counts = self.get_appointments().values('service__name').annotate(
             count=Count('service')
         ).order_by('-count').first()
@@ -855,8 +963,244 @@ class VisitorLog(models.Model):
     path = models.CharField(max_length=255) # e.g., "/landing/"
     referer = models.URLField(null=True, blank=True) # Where they came from
 
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set by the middleware at request time (rows are written later in bulk)
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
 
     def __str__(self):
         return f"{self.email or 'Anonymous'} - {self.timestamp}"
 
+
+class VisitorDailyStat(models.Model):
+    """Landing-page hits rolled up per day and referer by `rollup_visitor_logs`."""
+    date = models.DateField()
+    referer = models.CharField(max_length=200, blank=True) # '' = direct / no referer
+    visits = models.PositiveIntegerField(default=0)
+    unique_sessions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('date', 'referer')
+        ordering = ['-date', '-visits']
+
+    def __str__(self):
+        return f"{self.date} {self.referer or 'direct'}: {self.visits}"
+
+
+class VisitorSession(models.Model):
+    """
+    One row per tracked session (the conversion funnel), kept after the raw
+    VisitorLog rows are pruned. Maintained by `rollup_visitor_logs`.
+    """
+    session_key = models.CharField(max_length=40, unique=True)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+    visits = models.PositiveIntegerField(default=0)
+    referer = models.CharField(max_length=200, blank=True) # First referer seen
+    email = models.EmailField(null=True, blank=True)
+    converted = models.BooleanField(default=False) # Email became a DemoLead or ClientProfile
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['converted', 'last_seen'], name='visitor_session_funnel_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.session_key} ({'converted' if self.converted else 'open'})"
+
+
+
+class EmailOutbox(models.Model):
+    """
+    Transactional email queued by signals/views and delivered by the
+    `send_outbox` worker, so request handlers never wait on SMTP.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    recipients = models.JSONField(default=list)
+    from_email = models.CharField(max_length=254, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    html_body = models.TextField(blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+
+class DailyStatsBase(models.Model):
+    """
+    Per-day analytics rollup shared by the business and staff tables.
+    Rows are recomputed (never incremented) by utils.refresh_daily_stats.
+    """
+    date = models.DateField()
+    bookings = models.PositiveIntegerField(default=0)   # every appointment on the day
+    completed = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # completed x service price
+    no_show_profit = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # paid deposits on cancellations
+    hourly = models.JSONField(default=dict)    # {"9": 3, ...} bookings by start hour
+    services = models.JSONField(default=dict)  # {"Cut": {"count": 2, "revenue": 300.0}, ...}
+
+    class Meta:
+        abstract = True
+
+
+class DailyBusinessStats(DailyStatsBase):
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='daily_stats')
+
+    class Meta:
+        unique_together = ('business', 'date')
+
+    def __str__(self):
+        return f"{self.business} {self.date}"
+
+
+class DailyStaffStats(DailyStatsBase):
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='daily_staff_stats')
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE, related_name='daily_stats')
+
+    class Meta:
+        unique_together = ('staff', 'date')
+        indexes = [
+            models.Index(fields=['business', 'date'], name='dailystaffstats_biz_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.staff} {self.date}"
+
+
+class ClientStats(models.Model):
+    """
+    Precomputed per-client figures for the client list, so it can sort and filter on
+    indexed columns. Recomputed by utils.refresh_client_stats on appointment changes.
+    """
+    client = models.OneToOneField(ClientProfile, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='client_stats')
+    visit_count = models.PositiveIntegerField(default=0)  # completed appointments
+    last_visit_date = models.DateField(null=True, blank=True)  # latest completed appointment
+    lifetime_value = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # completed x service price
+    deposits_collected = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    favourite_service = models.ForeignKey(Service, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['business', 'lifetime_value'], name='clientstats_biz_ltv_idx'),
+            models.Index(fields=['business', 'last_visit_date'], name='clientstats_biz_last_idx'),
+            models.Index(fields=['business', 'visit_count'], name='clientstats_biz_visits_idx'),
+            models.Index(fields=['business', 'deposits_collected'], name='clientstats_biz_dep_idx'),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.client_id}"
+
+
+class SlotLedger(models.Model):
+    """
+    One row per business per day, used only as a lock: utils.reserve_slot takes it
+    with select_for_update, so the availability re-check and the insert of a booking
+    are atomic with respect to every other booking for that business on that day.
+    """
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='slot_ledgers')
+    date = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('business', 'date')
+
+    def __str__(self):
+        return f"{self.business} {self.date}"
+
+
+class WorkingHours(models.Model):
+    """
+    One working range on a weekday; several rows on the same weekday model breaks
+    (09:00-13:00 and 14:00-18:00). staff=None is the business's own schedule. Once a
+    business or staff member has any rows they replace the OperatingHours /
+    StaffOperatingHours buckets, and a weekday without rows is a day off.
+    """
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='working_hours')
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE, null=True, blank=True, related_name='working_hours')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    open_time = models.TimeField()
+    close_time = models.TimeField()
+
+    class Meta:
+        ordering = ['weekday', 'open_time']
+        verbose_name_plural = 'Working hours'
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if self.open_time and self.close_time and self.open_time >= self.close_time:
+            raise ValidationError("Closing time must be after opening time.")
+
+    def save(self, *args, **kwargs):
+        if self.staff_id:
+            self.business_id = self.staff.business_id
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        who = self.staff.name if self.staff_id else self.business.name
+        return f"{who}: {self.get_weekday_display()} {self.open_time}-{self.close_time}"
+
+
+class ScheduleOverride(models.Model):
+    """
+    Replaces the weekly hours on a single date (holiday hours, an extra Saturday).
+    Several rows on one date give several ranges; a row without times means closed.
+    A business-level override also clips staff who work their own hours that day.
+    """
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='schedule_overrides')
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE, null=True, blank=True, related_name='schedule_overrides')
+    date = models.DateField()
+    open_time = models.TimeField(null=True, blank=True)
+    close_time = models.TimeField(null=True, blank=True)
+    reason = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['date', 'open_time']
+        indexes = [
+            models.Index(fields=['business', 'date']),
+        ]
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if bool(self.open_time) != bool(self.close_time):
+            raise ValidationError("Set both opening and closing time, or neither to close for the day.")
+        if self.open_time and self.open_time >= self.close_time:
+            raise ValidationError("Closing time must be after opening time.")
+
+    def save(self, *args, **kwargs):
+        if self.staff_id:
+            self.business_id = self.staff.business_id
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        who = self.staff.name if self.staff_id else self.business.name
+        hours = f"{self.open_time}-{self.close_time}" if self.open_time else "closed"
+        return f"{who} on {self.date}: {hours}"
@@ -0,0 +1,122 @@
+"""
+Compiled weekly schedules.
+
+Working hours come from two places:
+- the original OperatingHours / StaffOperatingHours buckets (mon_fri, sat, sun),
+- WorkingHours rows (per weekday, several ranges per day for breaks) and
+  ScheduleOverride rows (one-off dates).
+
+`WeeklySchedule.compile(...)` folds all of them for one business into plain
+tuples of (open, close) minute ranges, so it pickles small, can sit in the
+cache and answers `ranges_for(day, staff_id)` without touching the database.
+
+Precedence for a staff member on a date:
+1. their own override for that date,
+2. their weekly hours (WorkingHours if they have any, else their buckets),
+   clipped to a business override for that date if there is one,
+3. the business schedule (override, else weekly hours).
+For the bucket tables a missing bucket falls back to the business, as before;
+once WorkingHours rows exist a weekday without rows is a day off.
+"""
+
+LEGACY_DAY_TYPES = {
+    'mon_fri': (0, 1, 2, 3, 4),
+    'sat': (5,),
+    'sun': (6,),
+}
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def merge_minute_ranges(ranges):
+    """Sorts and merges (open, close) minute ranges; empty ranges are dropped."""
+    merged = []
+    for low, high in sorted(r for r in ranges if r[0] < r[1]):
+        if merged and low <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(high, merged[-1][1]))
+        else:
+            merged.append((low, high))
+    return tuple(merged)
+
+
+def intersect_minute_ranges(first, second):
+    """Parts of `first` that also fall inside `second` (both merged)."""
+    result = []
+    for low, high in first:
+        for other_low, other_high in second:
+            start, end = max(low, other_low), min(high, other_high)
+            if start < end:
+                result.append((start, end))
+    return tuple(result)
+
+
+class WeeklySchedule:
+    """
+    weekly: {owner: 7-tuple indexed by weekday}; owner is a staff id, or None for the
+            business. An entry is a tuple of ranges, or None for "not set, use the business".
+    overrides: {(owner, date): tuple of ranges}; an empty tuple means closed that day.
+    """
+
+    def __init__(self, weekly, overrides):
+        self.weekly = weekly
+        self.overrides = overrides
+
+    @classmethod
+    def compile(cls, business_hours, staff_hours, working_hours, overrides):
+        """
+        business_hours: OperatingHours rows for the business
+        staff_hours: StaffOperatingHours rows for its staff
+        working_hours / overrides: WorkingHours / ScheduleOverride rows for the business
+        """
+        weekly = {}
+
+        # Weekly ranges replace the buckets for whoever has them
+        ranges_by_owner = {}
+        for row in working_hours:
+            days = ranges_by_owner.setdefault(row.staff_id, [[] for _ in range(7)])
+            days[row.weekday].append((to_minutes(row.open_time), to_minutes(row.close_time)))
+        for owner, days in ranges_by_owner.items():
+            weekly[owner] = tuple(merge_minute_ranges(day) for day in days)
+
+        buckets_by_owner = {None: list(business_hours)}
+        for row in staff_hours:
+            buckets_by_owner.setdefault(row.staff_id, []).append(row)
+        for owner, rows in buckets_by_owner.items():
+            if owner in weekly:
+                continue
+            days = [None] * 7
+            for row in rows:
+                for weekday in LEGACY_DAY_TYPES.get(row.day_type, ()):
+                    days[weekday] = merge_minute_ranges([(to_minutes(row.open_time), to_minutes(row.close_time))])
+            weekly[owner] = tuple(days)
+
+        override_ranges = {}
+        for row in overrides:
+            ranges = override_ranges.setdefault((row.staff_id, row.date), [])
+            if row.open_time and row.close_time:
+                ranges.append((to_minutes(row.open_time), to_minutes(row.close_time)))
+        compiled_overrides = {key: merge_minute_ranges(ranges) for key, ranges in override_ranges.items()}
+
+        return cls(weekly, compiled_overrides)
+
+    def ranges_for(self, day, staff_id=None):
+        """Working (open, close) minute ranges on `day`; empty when closed."""
+        weekday = day.weekday()
+        business_override = self.overrides.get((None, day))
+
+        if staff_id is not None:
+            own_override = self.overrides.get((staff_id, day))
+            if own_override is not None:
+                return own_override
+            staff_week = self.weekly.get(staff_id)
+            if staff_week and staff_week[weekday] is not None:
+                if business_override is None:
+                    return staff_week[weekday]
+                return intersect_minute_ranges(staff_week[weekday], business_override)
+
+        if business_override is not None:
+            return business_override
+        business_week = self.weekly.get(None)
+        return (business_week[weekday] if business_week else None) or ()
@@ -197,6 +197,7 @@ from django.template.loader import render_to_string
 from django.core.mail import send_mail
 from django.conf import settings
 from .models import Appointment
+from .utils import queue_email
 
 logger = logging.getLogger(__name__)
 
@@ -226,121 +227,153 @@ def notify_workflow(sender, instance, created, **kwargs):
             # Note: Using your requested template name 'owner_notify.html'
             html_owner = render_to_string('bookingApp/owner_notification.html', context)
 
-            send_mail(
+            queue_email(
                 subject=f"New Request: {instance.service.name} - {customer_name}",
                 message=f"New booking request from {customer_name}.",
-                from_email=settings.DEFAULT_FROM_EMAIL,
                 recipient_list=[owner.email],
                 html_message=html_owner,
-                fail_silently=True
             )
 
             if business.deposit_required:
                 logger.info(f"Appt {instance.id}: Owner notified. Customer must still pay deposit.")
 
-        # --- SECTION 2: STATUS UPDATES ---
-        if instance.status == 'cancelled':
-            # Notify Owner
-            context_owner = {
-                'appointment': instance,
-                'customer_name': customer_name,
-                'site_url': settings.SITE_URL,
-                'business': business
-            }
-            html_cancel_owner = render_to_string('bookingApp/owner_cancelled.html', context_owner)
-            send_mail(f"🚨 Cancelled: {customer_name}", "", settings.DEFAULT_FROM_EMAIL, [owner.email], html_message=html_cancel_owner, fail_silently=True)
-
-            # Notify Customer
-            if recipient:
-                context_cust = {
-                    'appointment': instance,
-                    'business': business,
-                    'site_url': settings.SITE_URL
-                }
-                html_declined = render_to_string('bookingApp/email_appointment_cancelled.html', context_cust)
-                send_mail(
-                    subject="Booking Update: Cancelled",
-                    message=f"Your appointment at {business.name} has been cancelled.",
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[recipient],
-                    html_message=html_declined,
-                    fail_silently=True
-                )
-
-        elif instance.status == 'confirmed' and recipient:
-            # 1. GCal Link Generation
-            start_dt = datetime.combine(instance.appointment_date, instance.appointment_start_time)
-            end_dt = start_dt + timedelta(minutes=instance.service.default_length_minutes)
-            fmt = "%Y%m%dT%H%M%S"
-
-            gcal_params = {
-                'action': 'TEMPLATE',
-                'text': f"{instance.service.name} @ {business.name}",
-                'dates': f"{start_dt.strftime(fmt)}/{end_dt.strftime(fmt)}",
-                'location': business.name,
-            }
-            gcal_link = "https://www.google.com/calendar/render?" + urllib.parse.urlencode(gcal_params)
-
-            # 2. Secure PayFast Link
-            payfast_url = None
-            m_id = str(business.payfast_merchant_id or "").strip()
-            if m_id.isdigit() and business.deposit_amount > 0 and not instance.deposit_paid:
-                pf_params = [
-                    ('merchant_id', m_id),
-                    ('merchant_key', str(business.payfast_merchant_key).strip()),
-                    ('return_url', f"{settings.SITE_URL}/booking/success/{instance.id}/"),
-                    ('cancel_url', f"{settings.SITE_URL}/"),
-                    ('notify_url', "https://www.getmebooked.co.za/payfast/itn/"),
-                    ('name_first', customer_name.split()[0]),
-                    ('email_address', recipient),
-                    ('m_payment_id', f"APP-{instance.id}"),
-                    ('amount', f"{business.deposit_amount:.2f}"),
-                    ('item_name', f"Deposit {instance.service.name}"),
-                ]
-
-                pf_common = "".join([f"{k}={urllib.parse.quote_plus(str(v).strip())}&" for k, v in pf_params])
-                pf_string = pf_common + "passphrase=VanWyknBake420"
-                sig = hashlib.md5(pf_string.encode()).hexdigest()
-
-                final_params = dict(pf_params)
-                final_params['signature'] = sig
-                payfast_url = "https://www.payfast.co.za/eng/process?" + urllib.parse.urlencode(final_params)
+        # --- SECTIONS 2 & 3: STATUS UPDATES, THANK YOU & REVIEW REQUEST ---
+        send_status_emails(instance)
 
-            context = {
-                'appointment': instance,
-                'business': business,
-                'gcal_link': gcal_link,
-                'payfast_url': payfast_url,
-                'site_url': settings.SITE_URL,
-            }
+    except Exception as e:
+        logger.error(f"Signal Error for Appt {instance.id}: {str(e)}", exc_info=True)
 
-            html_cust = render_to_string('bookingApp/customer_status_update.html', context)
-            send_mail(f"Confirmed: {instance.service.name}", "", settings.DEFAULT_FROM_EMAIL, [recipient], html_message=html_cust, fail_silently=True)
 
-        # --- SECTION 3: THANK YOU & REVIEW REQUEST ---
-        elif instance.status == 'completed' and recipient:
-            review_url = f"{settings.SITE_URL}/review/{instance.id}/"
-            booking_form_id = instance.booking_form.id if instance.booking_form else None
-            context = {
-                'customer_name': customer_name,
-                'business_name': business.name,
-                'review_url': review_url,
-                'site_url': settings.SITE_URL,
-                'booking_form_id': booking_form_id,
-            }
-            html_thank_you = render_to_string('bookingApp/email_thank_you_review.html', context)
-
-            send_mail(
-                subject=f"How was your appointment at {business.name}?",
-                message=f"Thank you for your visit! Please leave us a review: {review_url}",
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[recipient],
-                html_message=html_thank_you,
-                fail_silently=True
-            )
+def send_status_emails(instance):
+    """
+    Customer/owner emails for the appointment's current status (cancelled, confirmed,
+    completed). Shared by notify_workflow and utils.apply_status_change_side_effects,
+    which covers the queryset.update() paths that never fire post_save.
+    """
+    business = instance.business
+    recipient = instance.guest_email or (instance.customer.email if instance.customer else None)
+    customer_name = instance.guest_name or (instance.customer.get_full_name() if instance.customer else "Valued Customer")
+
+    if instance.status == 'cancelled' and instance.service:
+        send_cancellation_emails(instance)
+
+    elif instance.status == 'confirmed' and recipient and instance.service:
+        # 1. GCal Link Generation
+        start_dt = datetime.combine(instance.appointment_date, instance.appointment_start_time)
+        end_dt = start_dt + timedelta(minutes=instance.length_minutes)
+        fmt = "%Y%m%dT%H%M%S"
+
+        gcal_params = {
+            'action': 'TEMPLATE',
+            'text': f"{instance.service.name} @ {business.name}",
+            'dates': f"{start_dt.strftime(fmt)}/{end_dt.strftime(fmt)}",
+            'location': business.name,
+        }
+        gcal_link = "https://www.google.com/calendar/render?" + urllib.parse.urlencode(gcal_params)
+
+        # 2. Secure PayFast Link
+        payfast_url = None
+        m_id = str(business.payfast_merchant_id or "").strip()
+        if m_id.isdigit() and business.deposit_amount > 0 and not instance.deposit_paid:
+            pf_params = [
+                ('merchant_id', m_id),
+                ('merchant_key', str(business.payfast_merchant_key).strip()),
+                ('return_url', f"{settings.SITE_URL}/booking/success/{instance.id}/"),
+                ('cancel_url', f"{settings.SITE_URL}/"),
+                ('notify_url', "https://www.getmebooked.co.za/payfast/itn/"),
+                ('name_first', customer_name.split()[0]),
+                ('email_address', recipient),
+                ('m_payment_id', f"APP-{instance.id}"),
+                ('amount', f"{business.deposit_amount:.2f}"),
+                ('item_name', f"Deposit {instance.service.name}"),
+            ]
+
+            pf_common = "".join([f"{k}={urllib.parse.quote_plus(str(v).strip())}&" for k, v in pf_params])
+            pf_string = pf_common + "passphrase=VanWyknBake420"
+            sig = hashlib.md5(pf_string.encode()).hexdigest()
+
+            final_params = dict(pf_params)
+            final_params['signature'] = sig
+            payfast_url = "https://www.payfast.co.za/eng/process?" + urllib.parse.urlencode(final_params)
+
+        context = {
+            'appointment': instance,
+            'business': business,
+            'gcal_link': gcal_link,
+            'payfast_url': payfast_url,
+            'site_url': settings.SITE_URL,
+        }
+
+        html_cust = render_to_string('bookingApp/customer_status_update.html', context)
+        queue_email(f"Confirmed: {instance.service.name}", "", [recipient], html_message=html_cust)
+
+    # --- SECTION 3: THANK YOU & REVIEW REQUEST ---
+    elif instance.status == 'completed' and recipient:
+        send_review_request_email(instance)
+
+
+def send_cancellation_emails(instance):
+    """
+    Cancellation notices for the owner and the customer. Sent by send_status_emails.
+    """
+    business = instance.business
+    owner = business.owner
+    recipient = instance.guest_email or (instance.customer.email if instance.customer else None)
+    customer_name = instance.guest_name or (instance.customer.get_full_name() if instance.customer else "Valued Customer")
+
+    # Notify Owner
+    context_owner = {
+        'appointment': instance,
+        'customer_name': customer_name,
+        'site_url': settings.SITE_URL,
+        'business': business
+    }
+    html_cancel_owner = render_to_string('bookingApp/owner_cancelled.html', context_owner)
+    queue_email(f"🚨 Cancelled: {customer_name}", "", [owner.email], html_message=html_cancel_owner)
+
+    # Notify Customer
+    if recipient:
+        context_cust = {
+            'appointment': instance,
+            'business': business,
+            'site_url': settings.SITE_URL
+        }
+        html_declined = render_to_string('bookingApp/email_appointment_cancelled.html', context_cust)
+        queue_email(
+            subject="Booking Update: Cancelled",
+            message=f"Your appointment at {business.name} has been cancelled.",
+            recipient_list=[recipient],
+            html_message=html_declined,
+        )
 
-    except Exception as e:
-        logger.error(f"Signal Error for Appt {instance.id}: {str(e)}", exc_info=True)
+
+def send_review_request_email(instance):
+    """
+    Thank-you / review request for a completed appointment. Sent by send_status_emails.
+    """
+    business = instance.business
+    recipient = instance.guest_email or (instance.customer.email if instance.customer else None)
+    if not recipient:
+        return
+
+    customer_name = instance.guest_name or (instance.customer.get_full_name() if instance.customer else "Valued Customer")
+    review_url = f"{settings.SITE_URL}/review/{instance.id}/"
+    booking_form_id = instance.booking_form.id if instance.booking_form else None
+    context = {
+        'customer_name': customer_name,
+        'business_name': business.name,
+        'review_url': review_url,
+        'site_url': settings.SITE_URL,
+        'booking_form_id': booking_form_id,
+    }
+    html_thank_you = render_to_string('bookingApp/email_thank_you_review.html', context)
+
+    queue_email(
+        subject=f"How was your appointment at {business.name}?",
+        message=f"Thank you for your visit! Please leave us a review: {review_url}",
+        recipient_list=[recipient],
+        html_message=html_thank_you,
+    )
 # Keep your create_owner_as_staff and get_owner_gcal_link functions as they were
 
 from datetime import datetime, timedelta, timezone as dt_timezone # Add this
@@ -359,7 +392,7 @@ def get_owner_gcal_link(instance):
 
     # Make it aware using the project's local timezone (SAST)
     start_local = timezone.make_aware(naive_start)
-    end_local = start_local + timedelta(minutes=instance.service.default_length_minutes)
+    end_local = instance.ends_at or instance.compute_ends_at()
 
     fmt = "%Y%m%dT%H%M%SZ"
 
@@ -490,6 +523,7 @@ def send_demo_confirmation(sender, *, email, context=None, **kwargs):
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from .models import Appointment
+from django.db import transaction
 from .utils import send_push_notification
 @receiver(post_save, sender=Appointment)
 def notify_new_appointment(sender, instance, created, **kwargs):
@@ -499,26 +533,274 @@ def notify_new_appointment(sender, instance, created, **kwargs):
     # 1. Safely identify the service name for the message
     service_name = instance.service.name if instance.service else "Service"
 
-    # 2. Notify staff assigned to appointment
+    # 2. Collect staff + owner devices so they share ONE OneSignal call
+    player_ids = []
     if instance.staff and instance.staff.user:
         staff_user = instance.staff.user
-        player_id = getattr(getattr(staff_user, 'profile', None), 'onesignal_player_id', None)
-
-        if player_id:
-            send_push_notification(
-                [player_id],
-                f"New booking: {service_name} on {instance.appointment_date}"
-            )
+        player_ids.append(getattr(getattr(staff_user, 'profile', None), 'onesignal_player_id', None))
 
-    # 3. Notify business owner (Safely check booking_form)
+    # 3. Business owner (Safely check booking_form)
     if instance.booking_form and instance.booking_form.business:
         owner = instance.booking_form.business.owner
         if owner:
-            owner_player_id = getattr(getattr(owner, 'profile', None), 'onesignal_player_id', None)
+            player_ids.append(getattr(getattr(owner, 'profile', None), 'onesignal_player_id', None))
+
+    player_ids = [pid for pid in player_ids if pid]
+    if not player_ids:
+        return
+
+    customer = instance.guest_name or "a client"
+    message = f"New booking from {customer}: {service_name} on {instance.appointment_date}"
+    # Only push once the booking is actually committed
+    transaction.on_commit(lambda: send_push_notification(player_ids, message))
+
+
+
+# --- AVAILABILITY CACHE INVALIDATION ---
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import (
+    Appointment, Business, BusinessBlock, OperatingHours,
+    Service, StaffBlock, StaffOperatingHours,
+)
+from .utils import bump_availability_version
+
+# Appointment fields that change what get_available_times returns
+AVAILABILITY_FIELDS = {
+    'appointment_date', 'appointment_start_time', 'status', 'staff',
+    'service', 'attendees', 'booking_form', 'length_minutes',
+}
+
+
+def _appointment_business_id(appt):
+    if appt.business_id:
+        return appt.business_id
+    try:
+        if appt.booking_form_id:
+            return appt.booking_form.business_id
+        if appt.service_id:
+            return appt.service.business_id
+        if appt.staff_id:
+            return appt.staff.business_id
+    except ObjectDoesNotExist:
+        pass
+    return None
+
+
+def _touches_availability(update_fields):
+    return update_fields is None or bool(AVAILABILITY_FIELDS & set(update_fields))
+
+
+PENDING_TRACKED_FIELDS = {'status', 'staff', 'business'}
+
+
+@receiver(pre_save, sender=Appointment)
+@receiver(pre_save, sender=StaffBlock)
+def remember_previous_availability_date(sender, instance, update_fields=None, **kwargs):
+    """
+    Stores the date before a move so both the old and new day are invalidated.
+    For appointments the same single lookup also records whether the row was
+    pending (and for whom), so the cached pending counters can be moved.
+    """
+    instance._previous_availability_date = None
+    if sender is StaffBlock:
+        if instance.pk and (update_fields is None or 'block_date' in update_fields):
+            instance._previous_availability_date = (
+                StaffBlock.objects.filter(pk=instance.pk).values_list('block_date', flat=True).first()
+            )
+        return
+
+    instance._pending_tracked = False
+    instance._previous_pending = None
+    if not instance.pk:
+        return
+    fields = None if update_fields is None else set(update_fields)
+    if fields is not None and not (fields & (PENDING_TRACKED_FIELDS | {'appointment_date'})):
+        return
+
+    previous = Appointment.objects.filter(pk=instance.pk).values(
+        'appointment_date', 'status', 'business_id', 'staff_id'
+    ).first()
+    if previous:
+        instance._previous_availability_date = previous['appointment_date']
+        instance._pending_tracked = True
+        if previous['status'] == 'pending':
+            instance._previous_pending = (previous['business_id'], previous['staff_id'])
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def invalidate_appointment_availability(sender, instance, update_fields=None, **kwargs):
+    if not _touches_availability(update_fields):
+        return
+    bump_availability_version(
+        _appointment_business_id(instance),
+        [instance.appointment_date, getattr(instance, '_previous_availability_date', None)]
+    )
+
+
+@receiver(post_save, sender=StaffBlock)
+@receiver(post_delete, sender=StaffBlock)
+def invalidate_staff_block_availability(sender, instance, **kwargs):
+    try:
+        business_id = instance.staff.business_id
+    except ObjectDoesNotExist:
+        return
+    bump_availability_version(
+        business_id,
+        [instance.block_date, getattr(instance, '_previous_availability_date', None)]
+    )
+
+
+@receiver(post_save, sender=BusinessBlock)
+@receiver(post_delete, sender=BusinessBlock)
+def invalidate_business_block_availability(sender, instance, **kwargs):
+    bump_availability_version(instance.business_id, [instance.block_date])
+
+
+@receiver(post_save, sender=OperatingHours)
+@receiver(post_delete, sender=OperatingHours)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_business_schedule_availability(sender, instance, **kwargs):
+    # Hours and service lengths/capacity affect every date
+    bump_availability_version(instance.business_id)
+
+
+@receiver(post_save, sender=StaffOperatingHours)
+@receiver(post_delete, sender=StaffOperatingHours)
+def invalidate_staff_schedule_availability(sender, instance, **kwargs):
+    try:
+        business_id = instance.staff.business_id
+    except ObjectDoesNotExist:
+        return
+    bump_availability_version(business_id)
+
+
+@receiver(post_save, sender=Business)
+def invalidate_business_settings_availability(sender, instance, created, **kwargs):
+    # buffer_time lives on Business
+    if not created:
+        bump_availability_version(instance.id)
+
+
+@receiver(post_save, sender=Staff)
+@receiver(post_delete, sender=Staff)
+@receiver(m2m_changed, sender=Staff.services.through)
+def invalidate_staff_roster_availability(sender, instance, action=None, **kwargs):
+    # "Any staff" slots depend on who is active and which services they offer.
+    # For m2m changes `instance` is a Staff or a Service; both carry business_id.
+    if action is None or action.startswith('post_'):
+        bump_availability_version(instance.business_id)
+
+
+from .models import WorkingHours, ScheduleOverride
+
+
+@receiver(post_save, sender=WorkingHours)
+@receiver(post_delete, sender=WorkingHours)
+@receiver(post_save, sender=ScheduleOverride)
+@receiver(post_delete, sender=ScheduleOverride)
+def invalidate_compiled_schedule(sender, instance, **kwargs):
+    # The compiled schedule is cached under the business-wide generation
+    bump_availability_version(instance.business_id)
+
+
+# --- PENDING COUNTERS ---
+from .utils import adjust_pending_counts
+
+
+@receiver(post_save, sender=Appointment)
+def track_pending_counts(sender, instance, created, **kwargs):
+    if not created and not getattr(instance, '_pending_tracked', False):
+        return  # status/staff/business untouched by this save
+
+    before = None if created else instance._previous_pending
+    after = (instance.business_id, instance.staff_id) if instance.status == 'pending' else None
+    if before == after:
+        return
+    if before:
+        adjust_pending_counts(*before, -1)
+    if after:
+        adjust_pending_counts(*after, 1)
+
+
+@receiver(post_delete, sender=Appointment)
+def release_pending_count(sender, instance, **kwargs):
+    if instance.status == 'pending':
+        adjust_pending_counts(instance.business_id, instance.staff_id, -1)
+
+
+# --- DAILY ANALYTICS ROLLUPS & CLIENT STATS ---
+from .models import ClientProfile
+from .utils import refresh_appointment_rollups, refresh_client_stats
+
+STATS_FIELDS = {
+    'status', 'staff', 'business', 'service', 'appointment_date', 'appointment_start_time',
+    'deposit_paid', 'amount_to_pay',
+}
+
+
+CLIENT_STATS_FIELDS = {
+    'status', 'business', 'service', 'appointment_date', 'deposit_paid', 'amount_to_pay',
+    'guest_email', 'customer',
+}
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def refresh_appointment_stats(sender, instance, update_fields=None, **kwargs):
+    fields = None if update_fields is None else set(update_fields)
+    dates = emails = ()
+    if fields is None or STATS_FIELDS & fields:
+        dates = {instance.appointment_date, getattr(instance, '_previous_availability_date', None)}
+    if fields is None or CLIENT_STATS_FIELDS & fields:
+        emails = {instance.guest_email, instance.customer.email if instance.customer_id else None}
+    refresh_appointment_rollups(instance.business_id, dates, emails)
+
+
+@receiver(post_save, sender=ClientProfile)
+def refresh_profile_client_stats(sender, instance, created, update_fields=None, **kwargs):
+    # New profiles (and email changes) pick up any appointments already booked under that email
+    if update_fields is not None and 'email' not in update_fields:
+        return
+    business_id, email = instance.business_id, instance.email
+    transaction.on_commit(lambda: refresh_client_stats(business_id, [email]))
+
+
+# --- RATING AGGREGATES ---
+from .models import Review
+from .utils import apply_rating_change
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = Review.objects.filter(pk=instance.pk).values_list('business_id', 'rating').first()
+
+
+@receiver(post_save, sender=Review)
+def track_review_rating(sender, instance, created, **kwargs):
+    # Runs in the review's own transaction, so the aggregates commit (or roll back) with it
+    rating = int(instance.rating)  # views pass the raw POST string
+    previous = getattr(instance, '_previous_rating', None)
+    business = _loaded_business(instance)
+    if previous is None:
+        apply_rating_change(instance.business_id, rating, 1, business)
+    elif previous[0] != instance.business_id:
+        apply_rating_change(previous[0], -previous[1], -1)
+        apply_rating_change(instance.business_id, rating, 1, business)
+    else:
+        apply_rating_change(instance.business_id, rating - previous[1], 0, business)
+
+
+@receiver(post_delete, sender=Review)
+def release_review_rating(sender, instance, **kwargs):
+    apply_rating_change(instance.business_id, -int(instance.rating), -1, _loaded_business(instance))
 
-            if owner_player_id:
-                send_push_notification(
-                    [owner_player_id],
-                    f"New booking for your business: {service_name} on {instance.appointment_date}"
-                )
 
+def _loaded_business(review):
+    # Only refresh a business the caller already holds; don't fetch one just to refresh it
+    return review.business if Review.business.is_cached(review) else None
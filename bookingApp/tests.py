@@ -1,3 +1,1055 @@
-from django.test import TestCase
+import json
+import random
+import tempfile
+import threading
+import uuid
+import zipfile
+from datetime import date, time, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from time import monotonic, sleep
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .middleware import VisitorLogBuffer
+from .models import (
+    Appointment, Business, BusinessBlock, ClientStats, DailyBusinessStats, DailyStaffStats, EmailOutbox,
+    OperatingHours, Review, Service, Staff, StaffBlock, StaffOperatingHours, VisitorDailyStat, VisitorLog,
+    VisitorSession,
+)
+from .utils import (
+    SlotUnavailable, drain_email_outbox, expire_unpaid_holds, get_available_times, get_pending_count,
+    process_auto_completions, queue_email, reserve_slot, rollup_visitor_logs, single_instance_lock,
+)
+
+
+def next_weekday(weekday, weeks_ahead=1):
+    """A future date on `weekday` (0 = Monday), clear of the 'today' slot cut-off."""
+    day = timezone.localdate() + timedelta(weeks=weeks_ahead)
+    return day + timedelta(days=(weekday - day.weekday()) % 7)
+
+
+def make_business(buffer_time=10, name='Studio'):
+    """Business (owner auto-created as staff) open 08:00-18:00 weekdays and 09:00-13:00 Saturdays."""
+    owner = User.objects.create(username=f'owner-{name}', email=f'{name}@example.com')
+    business = Business.objects.create(
+        owner=owner, name=name, buffer_time=buffer_time,
+        subscription_end_date=timezone.now() + timedelta(days=30),
+    )
+    OperatingHours.objects.create(business=business, day_type='mon_fri', open_time=time(8), close_time=time(18))
+    OperatingHours.objects.create(business=business, day_type='sat', open_time=time(9), close_time=time(13))
+    return business
+
+
+def book(business, service, day, start, staff=None, status='confirmed', attendees=1):
+    return Appointment.objects.create(
+        booking_form=business.booking_form, service=service, staff=staff,
+        appointment_date=day, appointment_start_time=start, status=status,
+        guest_name='Guest', guest_email='guest@example.com', attendees=attendees,
+    )
+
+
+@override_settings(AVAILABILITY_CACHE_TIMEOUT=0)
+class AvailabilityEngineEquivalenceTests(TestCase):
+    """The interval/bisect engine must return exactly what the original slot x appointment scan does."""
+
+    def setUp(self):
+        self.rng = random.Random(7)
+        self.business = make_business(buffer_time=10)
+        self.services = [
+            Service.objects.create(business=self.business, name='Cut', default_length_minutes=30, price=100),
+            Service.objects.create(business=self.business, name='Colour', default_length_minutes=90, price=300),
+            Service.objects.create(business=self.business, name='Class', default_length_minutes=45, price=80, capacity=4),
+        ]
+        self.owner_staff = Staff.objects.get(business=self.business)
+        self.second_staff = Staff.objects.create(business=self.business, name='Second')
+        for member in (self.owner_staff, self.second_staff):
+            member.services.set(self.services)
+        # Second staff member works a shorter day with a lunch break
+        StaffOperatingHours.objects.create(staff=self.second_staff, day_type='mon_fri', open_time=time(10), close_time=time(16))
+        self.start = next_weekday(0)
+
+    def random_diary(self, days):
+        staff_choices = [self.owner_staff, self.second_staff, None]
+        for _ in range(150):
+            book(
+                self.business, self.rng.choice(self.services),
+                self.start + timedelta(days=self.rng.randrange(days)),
+                time(self.rng.randint(8, 17), self.rng.choice([0, 5, 15, 30, 45, 50])),
+                staff=self.rng.choice(staff_choices),
+                status=self.rng.choice(['confirmed', 'pending', 'rescheduled', 'cancelled']),
+                attendees=self.rng.randint(1, 3),
+            )
+        # Breaks: lunch and an afternoon block for the second staff member
+        for offset in range(days):
+            StaffBlock.objects.create(
+                staff=self.second_staff, block_date=self.start + timedelta(days=offset),
+                start_time=time(12), end_time=time(13), reason='Lunch',
+            )
+        StaffBlock.objects.create(
+            staff=self.owner_staff, block_date=self.start + timedelta(days=1),
+            start_time=time(14, 10), end_time=time(15, 40),
+        )
+        BusinessBlock.objects.create(business=self.business, block_date=self.start + timedelta(days=4))
+
+    def assert_engines_agree(self, days):
+        compared = 0
+        for offset in range(days):
+            day = self.start + timedelta(days=offset)
+            for staff_id in (None, self.owner_staff.id, self.second_staff.id):
+                for service in self.services:
+                    kwargs = dict(staff_id=staff_id, service_obj=service)
+                    legacy = get_available_times(self.business, day, service.default_length_minutes, engine='legacy', **kwargs)
+                    interval = get_available_times(self.business, day, service.default_length_minutes, engine='interval', **kwargs)
+                    self.assertEqual(legacy, interval, f"{day} staff={staff_id} service={service.name}")
+                    compared += bool(legacy)
+        return compared
+
+    def test_multi_staff_days_with_breaks_and_group_sessions(self):
+        self.random_diary(days=7)
+        self.assertGreater(self.assert_engines_agree(days=7), 0)
+
+    def test_buffer_sizes(self):
+        self.random_diary(days=3)
+        for buffer_time in (0, 5, 15, 30):
+            self.business.buffer_time = buffer_time
+            self.business.save()
+            self.assert_engines_agree(days=3)
+
+    def test_group_capacity_fills_up(self):
+        day = self.start
+        group = self.services[2]
+        book(self.business, group, day, time(10), staff=self.owner_staff, attendees=3)
+        for engine in ('legacy', 'interval'):
+            slots = get_available_times(self.business, day, 45, staff_id=self.owner_staff.id, service_obj=group, engine=engine)
+            self.assertIn(time(10), slots, engine)
+        book(self.business, group, day, time(10), staff=self.owner_staff, attendees=1)
+        self.assert_engines_agree(days=1)
+        slots = get_available_times(self.business, day, 45, staff_id=self.owner_staff.id, service_obj=group)
+        self.assertNotIn(time(10), slots)
+
+
+@override_settings(AVAILABILITY_CACHE_TIMEOUT=0)
+class AvailabilityRangeEndpointTests(TestCase):
+
+    def setUp(self):
+        self.business = make_business(buffer_time=0)
+        self.group = Service.objects.create(business=self.business, name='Class', default_length_minutes=60, price=80, capacity=3)
+        self.staff = Staff.objects.get(business=self.business)
+        self.staff.services.set([self.group])
+        self.day = next_weekday(2)
+
+    def test_range_matches_per_day_slots_for_group_sessions(self):
+        # A part-filled group session still has room, so 10:00 stays bookable
+        book(self.business, self.group, self.day, time(10), staff=self.staff, attendees=2)
+        params = {'business_id': self.business.id, 'service_id': self.group.id, 'staff_id': self.staff.id}
+
+        per_day = self.client.get('/api/available-slots/', {**params, 'date': self.day.isoformat()}).json()['slots']
+        days = self.client.get(
+            '/api/availability/range/', {**params, 'start': self.day.isoformat(), 'end': self.day.isoformat()}
+        ).json()['days']
+
+        self.assertIn('10:00', per_day)
+        self.assertEqual(days[0]['slots'], per_day)
+
+    def test_range_matches_per_day_slots_for_any_staff(self):
+        cut = Service.objects.create(business=self.business, name='Cut', default_length_minutes=30, price=100)
+        second = Staff.objects.create(business=self.business, name='Second')
+        for member in (self.staff, second):
+            member.services.add(cut)
+        next_day = self.day + timedelta(days=1)
+        book(self.business, cut, self.day, time(10), staff=self.staff)
+        book(self.business, cut, self.day, time(11), staff=self.staff)
+        book(self.business, cut, self.day, time(11), staff=None)
+        book(self.business, cut, next_day, time(9), staff=self.staff)
+        StaffBlock.objects.create(staff=second, block_date=next_day, start_time=time(8), end_time=time(12))
+        params = {'business_id': self.business.id, 'service_id': cut.id}
+
+        days = self.client.get(
+            '/api/availability/range/', {**params, 'start': self.day.isoformat(), 'end': next_day.isoformat()}
+        ).json()['days']
+        per_day = [
+            self.client.get('/api/available-slots/', {**params, 'date': d.isoformat()}).json()['slots']
+            for d in (self.day, next_day)
+        ]
+
+        # One staff member busy at 10:00 leaves the other free; at 11:00 an unassigned booking takes them
+        self.assertIn('10:00', per_day[0])
+        self.assertNotIn('11:00', per_day[0])
+        self.assertNotIn('09:00', per_day[1])
+        self.assertIn('12:00', per_day[1])
+        self.assertEqual([day['slots'] for day in days], per_day)
+
+    def test_range_sees_the_buffer_of_a_booking_just_after_midnight(self):
+        Business.objects.filter(pk=self.business.pk).update(buffer_time=30)
+        OperatingHours.objects.filter(business=self.business, day_type='mon_fri').update(close_time=time(23, 59))
+        cut = Service.objects.create(business=self.business, name='Cut', default_length_minutes=30, price=100)
+        next_day = self.day + timedelta(days=1)
+        # Booked by staff outside the hours; its buffer starts at 23:40 the night before
+        book(self.business, cut, next_day, time(0, 10), staff=self.staff)
+        params = {'business_id': self.business.id, 'service_id': cut.id, 'staff_id': self.staff.id}
+
+        days = self.client.get(
+            '/api/availability/range/', {**params, 'start': self.day.isoformat(), 'end': next_day.isoformat()}
+        ).json()['days']
+        per_day = [
+            self.client.get('/api/available-slots/', {**params, 'date': d.isoformat()}).json()['slots']
+            for d in (self.day, next_day)
+        ]
+
+        self.assertIn('23:00', per_day[0])
+        self.assertNotIn('23:15', per_day[0])
+        self.assertEqual([day['slots'] for day in days], per_day)
+
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+SHARED_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'test_cache'}}
+
+
+class AvailabilityCacheTests(TestCase):
+    """Slots are cached only where every worker sees the same version keys."""
+
+    @classmethod
+    def setUpClass(cls):
+        # DDL before TestCase opens its class-wide transaction
+        with override_settings(CACHES=SHARED_CACHE):
+            call_command('createcachetable', verbosity=0)
+        super().setUpClass()
+
+    def setUp(self):
+        self.business = make_business(buffer_time=0)
+        self.service = Service.objects.create(business=self.business, name='Cut', default_length_minutes=60, price=100)
+        self.day = next_weekday(1)
+        self.appointment = book(self.business, self.service, self.day, time(10))
+
+    def change_elsewhere(self):
+        # .update() skips the signals, like a change made by another worker or a cron job
+        Appointment.objects.filter(pk=self.appointment.pk).update(status='cancelled')
+
+    @override_settings(CACHES=LOCMEM_CACHE, AVAILABILITY_CACHE_TIMEOUT=300)
+    def test_per_process_cache_is_not_used(self):
+        self.assertNotIn(time(10), get_available_times(self.business, self.day, 60))
+        self.change_elsewhere()
+        self.assertIn(time(10), get_available_times(self.business, self.day, 60))
+
+    @override_settings(CACHES=SHARED_CACHE, AVAILABILITY_CACHE_TIMEOUT=300)
+    def test_shared_cache_serves_until_the_version_is_bumped(self):
+        from .utils import bump_availability_version
+        cache.clear()
+        self.assertNotIn(time(10), get_available_times(self.business, self.day, 60))
+        self.change_elsewhere()
+        self.assertNotIn(time(10), get_available_times(self.business, self.day, 60))
+        bump_availability_version(self.business.id, [self.day])
+        self.assertIn(time(10), get_available_times(self.business, self.day, 60))
+
+    def test_default_cache_is_shared(self):
+        from .utils import cache_is_shared
+        self.assertTrue(cache_is_shared())
+        cache.set('probe', 1)
+        self.assertEqual(cache.get('probe'), 1)
+
+
+class OneSignalStub:
+    """
+    Minimal local stand-in for the OneSignal notifications API.
+    Every POST body is recorded in `.requests` and answered like OneSignal does.
+    """
+
+    def __init__(self):
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                stub.requests.append(payload)
+
+                body = json.dumps({
+                    'id': str(uuid.uuid4()),
+                    'recipients': len(payload.get('include_player_ids', [])),
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/v1/notifications"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class PushNotificationTests(TestCase):
+
+    def test_one_coalesced_payload_per_push(self):
+        from .utils import send_push_notification
+        with OneSignalStub() as stub, override_settings(ONESIGNAL_API_URL=stub.url, ONESIGNAL_APP_ID='app'):
+            response = send_push_notification(['p1', '', 'p2', 'p1', None], 'Booked for 10:00', heading='New Booking', background=False)
+            self.assertEqual(response.json()['recipients'], 2)
+
+            future = send_push_notification(['p3'], 'Cancelled', heading='Cancellation', background=True)
+            future.result(timeout=5)
+
+        self.assertEqual(stub.requests, [
+            {'app_id': 'app', 'include_player_ids': ['p1', 'p2'],
+             'headings': {'en': 'New Booking'}, 'contents': {'en': 'Booked for 10:00'}},
+            {'app_id': 'app', 'include_player_ids': ['p3'],
+             'headings': {'en': 'Cancellation'}, 'contents': {'en': 'Cancelled'}},
+        ])
+
+    def test_no_request_without_recipients(self):
+        from .utils import send_push_notification
+        with OneSignalStub() as stub, override_settings(ONESIGNAL_API_URL=stub.url):
+            self.assertIsNone(send_push_notification(['', None], 'Nobody to tell', background=False))
+        self.assertEqual(stub.requests, [])
+
+
+class QueryPlanTests(TestCase):
+
+    def test_hot_queries_use_their_indexes(self):
+        from .utils import explain_hot_queries
+        business = make_business()
+        service = Service.objects.create(business=business, name='Cut', default_length_minutes=30, price=100)
+        staff = Staff.objects.get(business=business)
+        day = next_weekday(0)
+        for hour in range(8, 17):
+            book(business, service, day, time(hour), staff=staff, status='pending' if hour % 2 else 'confirmed')
+
+        results = {label: used for label, used, expected, plan in explain_hot_queries(business.id, staff.id)}
+
+        self.assertEqual(results['get_available_times (business)'], 'appt_business_span_idx')
+        self.assertEqual(results['get_available_times (staff)'], 'appt_staff_span_idx')
+        self.assertEqual([label for label, used in results.items() if not used], [])
+
+
+class PendingCountTests(TestCase):
+    """Nav badge counts must follow changes made by other workers and cron jobs."""
+
+    @classmethod
+    def setUpClass(cls):
+        with override_settings(CACHES=SHARED_CACHE):
+            call_command('createcachetable', verbosity=0)
+        super().setUpClass()
+
+    def setUp(self):
+        self.business = make_business()
+        self.service = Service.objects.create(business=self.business, name='Cut', default_length_minutes=30, price=100)
+        self.appointment = book(self.business, self.service, next_weekday(0), time(9), status='pending')
+
+    def badge(self):
+        from django.test import RequestFactory
+        from .context_processors import pending_appointments_count
+        request = RequestFactory().get('/')
+        request.user = self.business.owner
+        return pending_appointments_count(request)['pending_count']
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_per_process_cache_falls_back_to_count(self):
+        self.assertEqual(self.badge(), 1)
+        # Like expire_holds / auto-completion running in another process
+        Appointment.objects.filter(pk=self.appointment.pk).update(status='cancelled')
+        self.assertEqual(self.badge(), 0)
+
+    @override_settings(CACHES=SHARED_CACHE)
+    def test_shared_cache_counters_follow_signals(self):
+        cache.clear()
+        self.assertEqual(self.badge(), 1)
+        book(self.business, self.service, next_weekday(0), time(11), status='pending')
+        self.assertEqual(self.badge(), 2)
+        self.appointment.status = 'confirmed'
+        self.appointment.save()
+        self.assertEqual(self.badge(), 1)
+
+    @override_settings(CACHES=SHARED_CACHE)
+    def test_staff_dashboard_confirm_releases_the_counter(self):
+        cache.clear()
+        Appointment.objects.filter(pk=self.appointment.pk).update(staff=Staff.objects.get(business=self.business))
+        self.assertEqual(self.badge(), 1)
+        self.client.force_login(self.business.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/staff/dashboard/', {'confirm_appointment': '1', 'appointment_id': self.appointment.pk})
+        self.assertEqual(Appointment.objects.get(pk=self.appointment.pk).status, 'confirmed')
+        self.assertEqual(self.badge(), 0)
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.business = make_business()
+
+    def review(self, rating, business=None):
+        return Review.objects.create(business=business or self.business, guest_name='Guest', rating=rating, comment='-')
+
+    def test_reviews_keep_aggregates_in_step(self):
+        first = self.review(5)
+        self.review(2)
+        self.assertEqual((self.business.review_count, self.business.average_rating), (2, 3.5))
+        first.rating = 3
+        first.save()
+        first.delete()
+        self.business.refresh_from_db()
+        self.assertEqual((self.business.review_count, self.business.average_rating), (1, 2.0))
+
+    def test_average_is_rounded_once_through_add_edit_and_delete(self):
+        reviews = [self.review(rating) for rating in [4] * 11 + [5, 1]]
+        self.business.refresh_from_db()
+        # 50 / 13 = 3.846: stored as 3.85, which must not round on up to 3.9
+        self.assertEqual((self.business.rating_sum, self.business.average_rating), (50, 3.8))
+
+        reviews[-1].rating = 3
+        reviews[-1].save()
+        self.business.refresh_from_db()
+        self.assertEqual((self.business.rating_sum, self.business.average_rating), (52, 4.0))
+
+        reviews[-1].delete()
+        reviews[-2].delete()
+        self.business.refresh_from_db()
+        self.assertEqual((self.business.review_count, self.business.average_rating), (11, 4.0))
+
+        self.review(1)
+        self.business.refresh_from_db()
+        self.assertEqual((self.business.rating_sum, self.business.average_rating), (45, 3.8))
+
+    def test_saving_the_reviewed_business_keeps_aggregates(self):
+        self.review(4)
+        self.business.name = 'Renamed'
+        self.business.save()
+        self.business.refresh_from_db()
+        self.assertEqual((self.business.rating_sum, self.business.rating_count), (4, 1))
+
+
+class ReserveSlotConcurrencyTests(TransactionTestCase):
+    """Simultaneous reservations of one slot must leave exactly one booking."""
+
+    def test_one_slot_one_winner(self):
+        business = make_business()
+        service = Service.objects.create(business=business, name='Cut', default_length_minutes=30, price=100)
+        staff = Staff.objects.get(business=business)
+        day = next_weekday(1)
+        barrier = threading.Barrier(4)
+        outcomes = []
+
+        def attempt():
+            barrier.wait()
+            try:
+                for _ in range(100):
+                    appointment = Appointment(
+                        booking_form=business.booking_form, service=service, staff=staff,
+                        appointment_date=day, appointment_start_time=time(10), status='confirmed',
+                        guest_name='Guest', guest_email='guest@example.com',
+                    )
+                    try:
+                        reserve_slot(business, appointment, service, staff_id=staff.id)
+                    except SlotUnavailable:
+                        outcomes.append('taken')
+                    except OperationalError:
+                        # SQLite has no row locks and reports a busy table instead of waiting
+                        sleep(0.01)
+                        continue
+                    else:
+                        outcomes.append('booked')
+                    return
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt) for _ in range(barrier.parties)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count('booked'), 1)
+        self.assertEqual(outcomes.count('taken'), barrier.parties - 1)
+        self.assertEqual(Appointment.objects.filter(business=business, appointment_date=day).count(), 1)
+
+
+@override_settings(AVAILABILITY_CACHE_TIMEOUT=0)
+class RescheduleAndManualBookingTests(TestCase):
+    def setUp(self):
+        self.business = make_business(buffer_time=10)
+        self.service = Service.objects.create(business=self.business, name='Cut', default_length_minutes=30, price=100)
+        self.staff = Staff.objects.get(business=self.business)
+        self.day = next_weekday(1)
+
+    def reschedule(self, appointment, start):
+        return self.client.post(f'/appointment/reschedule/{appointment.reschedule_token}/', {
+            'appointment_date': self.day.isoformat(), 'appointment_start_time': start,
+            'notes': '', 'confirm_deposit_loss': 'on',
+        })
+
+    def manual_booking(self, start):
+        self.client.force_login(self.business.owner)
+        return self.client.post(f'/business/{self.business.id}/manual-booking/', {
+            'guest_name': 'Walk-in', 'guest_email': 'walkin@example.com', 'guest_phone': '0820000000',
+            'staff': self.staff.id, 'service': self.service.id,
+            'appointment_date': self.day.isoformat(), 'appointment_start_time': start, 'notes': '',
+        })
+
+    def test_reschedule_can_overlap_its_own_current_time(self):
+        appointment = book(self.business, self.service, self.day, time(10), staff=self.staff)
+        self.reschedule(appointment, '10:30')
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.appointment_start_time, time(10, 30))
+
+    def test_late_reschedule_can_overlap_the_cancelled_booking(self):
+        self.business.reschedule_window_hours = 24 * 30
+        self.business.save()
+        appointment = book(self.business, self.service, self.day, time(10), staff=self.staff)
+        self.reschedule(appointment, '10:30')
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'cancelled')
+        self.assertTrue(Appointment.objects.filter(appointment_start_time=time(10, 30), status='pending').exists())
+
+    def test_reschedule_is_checked_with_the_bookings_own_length(self):
+        appointment = book(self.business, self.service, self.day, time(8), staff=self.staff)
+        Appointment.objects.filter(pk=appointment.pk).update(length_minutes=90)
+        book(self.business, self.service, self.day, time(12), staff=self.staff)
+        # 30 minutes would fit before 12:00; the booking's 90 don't
+        response = self.reschedule(appointment, '11:00')
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.appointment_start_time, time(8))
+        self.assertTrue(response.context['form'].errors)
+
+    def test_manual_booking_outside_hours_is_accepted(self):
+        self.manual_booking('19:00')
+        self.assertTrue(Appointment.objects.filter(appointment_start_time=time(19), staff=self.staff).exists())
+
+    def test_manual_booking_refuses_a_clash(self):
+        book(self.business, self.service, self.day, time(14), staff=self.staff)
+        response = self.manual_booking('14:15')
+        self.assertTrue(response.context['form'].errors)
+        self.assertEqual(Appointment.objects.filter(staff=self.staff).count(), 1)
+
+
+class AutoCompletionTests(TestCase):
+    def setUp(self):
+        self.business = make_business()
+        self.service = Service.objects.create(business=self.business, name='Cut', default_length_minutes=30, price=100)
+        self.staff = Staff.objects.get(business=self.business)
+        self.day = timezone.localdate() - timedelta(days=2)
+
+    def test_past_bookings_complete_with_stats_and_review_emails(self):
+        with_form = book(self.business, self.service, self.day, time(9), staff=self.staff)
+        # Rows from before booking forms were mandatory only carry the business
+        without_form = Appointment.objects.create(
+            business=self.business, service=self.service, staff=self.staff, appointment_date=self.day,
+            appointment_start_time=time(11), status='confirmed', guest_name='Old', guest_email='old@example.com',
+        )
+        upcoming = book(self.business, self.service, next_weekday(0), time(9), staff=self.staff)
+        EmailOutbox.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_auto_completions(timezone.now()), 2)
+
+        statuses = dict(Appointment.objects.values_list('id', 'status'))
+        self.assertEqual(
+            [statuses[a.id] for a in (with_form, without_form, upcoming)], ['completed', 'completed', 'confirmed']
+        )
+        self.assertEqual(DailyBusinessStats.objects.get(business=self.business, date=self.day).completed, 2)
+        self.assertEqual(
+            sorted(r for row in EmailOutbox.objects.values_list('recipients', flat=True) for r in row),
+            ['guest@example.com', 'old@example.com'],
+        )
+
+
+class HoldExpiryTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with override_settings(CACHES=SHARED_CACHE):
+            call_command('createcachetable', verbosity=0)
+        super().setUpClass()
+
+    def setUp(self):
+        self.business = make_business()
+        Business.objects.filter(pk=self.business.pk).update(
+            deposit_enabled=True, deposit_amount=50, payfast_merchant_id='10000100', payfast_merchant_key='key',
+        )
+        self.service = Service.objects.create(business=self.business, name='Cut', default_length_minutes=30, price=100)
+        self.staff = Staff.objects.get(business=self.business)
+        self.day = next_weekday(3)
+
+    @override_settings(CACHES=SHARED_CACHE, DEPOSIT_HOLD_MINUTES=10)
+    def test_expired_hold_refreshes_counters_and_rollups(self):
+        cache.clear()
+        book(self.business, self.service, timezone.localdate() - timedelta(days=7), time(9), staff=self.staff, status='completed')
+        hold = book(self.business, self.service, self.day, time(9), staff=self.staff, status='pending')
+        Appointment.objects.filter(pk=hold.pk).update(created_at=timezone.now() - timedelta(minutes=30))
+        self.assertEqual(get_pending_count(business_id=self.business.id), 1)
+        EmailOutbox.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_unpaid_holds(), 1)
+
+        hold.refresh_from_db()
+        self.assertEqual(hold.status, 'cancelled')
+        self.assertEqual(get_pending_count(business_id=self.business.id), 0)
+        self.assertEqual(get_pending_count(staff_id=self.staff.id), 0)
+        self.assertEqual(DailyBusinessStats.objects.get(business=self.business, date=self.day).bookings, 1)
+        self.assertEqual(ClientStats.objects.get(client__email='guest@example.com').visit_count, 1)
+        self.assertIn(['guest@example.com'], list(EmailOutbox.objects.values_list('recipients', flat=True)))
+
+
+class VisitorLogBufferTests(TransactionTestCase):
+    """Hits are written by the buffer's own thread, never on the request that adds them."""
+
+    def hit(self, buffer, key='visitor'):
+        buffer.add(SimpleNamespace(session_key=key), path='/', timestamp=timezone.now())
+
+    def wait_for_rows(self, count, timeout=5):
+        deadline = monotonic() + timeout
+        while VisitorLog.objects.count() < count and monotonic() < deadline:
+            sleep(0.02)
+        return VisitorLog.objects.count()
+
+    def test_full_buffer_is_flushed_without_waiting_for_the_timer(self):
+        buffer = VisitorLogBuffer(max_size=3, max_age=60)
+        self.hit(buffer)
+        self.hit(buffer)
+        sleep(0.2)
+        self.assertEqual(VisitorLog.objects.count(), 0)
+
+        self.hit(buffer)
+        self.assertEqual(self.wait_for_rows(3), 3)
+
+    def test_quiet_buffer_is_flushed_once_the_oldest_hit_is_due(self):
+        buffer = VisitorLogBuffer(max_size=100, max_age=0.3)
+        self.hit(buffer)
+        # No further traffic: the timer alone must write the row
+        self.assertEqual(self.wait_for_rows(1), 1)
+        self.assertEqual(VisitorLog.objects.get().session_key, 'visitor')
+
+
+class FlakyEmailBackend(LocmemEmailBackend):
+    """locmem backend that counts connections and refuses mail to bounce@ addresses."""
+    opened = 0
+
+    def open(self):
+        type(self).opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(address.startswith('bounce@') for address in message.to):
+                raise OSError('550 mailbox unavailable')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='bookingApp.tests.FlakyEmailBackend', EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+class EmailOutboxTests(TestCase):
+
+    def test_worker_delivers_queued_mail(self):
+        row = queue_email('Booking confirmed', 'See you at 10:00', ['guest@example.com', ''], html_message='<p>10:00</p>')
+        self.assertEqual(mail.outbox, [])
+
+        call_command('send_outbox', stdout=StringIO())
+
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), ('sent', 1))
+        self.assertEqual([m.to for m in mail.outbox], [['guest@example.com']])
+
+    def test_failed_send_backs_off_then_gives_up(self):
+        good = queue_email('Reminder', 'Tomorrow', ['guest@example.com'])
+        bad = queue_email('Reminder', 'Tomorrow', ['bounce@example.com'])
+
+        self.assertEqual(drain_email_outbox(), (1, 1))
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), ('pending', 1))
+        self.assertIn('550', bad.last_error)
+        self.assertGreater(bad.next_attempt_at, timezone.now())
+        # Not due yet, and the delivered row is never resent
+        self.assertEqual(drain_email_outbox(), (0, 0))
+
+        EmailOutbox.objects.filter(pk=bad.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(drain_email_outbox(), (0, 1))
+        bad.refresh_from_db()
+        good.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), ('failed', 2))
+        self.assertEqual(good.status, 'sent')
+        self.assertEqual(len(mail.outbox), 1)
+
+
+
+@override_settings(EMAIL_BACKEND='bookingApp.tests.FlakyEmailBackend')
+class ReminderBatchTests(TestCase):
+
+    def test_one_connection_per_batch_and_only_delivered_reminders_marked(self):
+        from .utils import send_reminder_batch
+        business = make_business()
+        service = Service.objects.create(business=business, name='Cut', default_length_minutes=30, price=100)
+        day = next_weekday(1)
+        appointments = [book(business, service, day, time(9 + hour)) for hour in range(5)]
+        Appointment.objects.filter(pk=appointments[2].pk).update(guest_email='bounce@example.com')
+        appointments = list(Appointment.objects.filter(pk__in=[a.pk for a in appointments]).select_related('booking_form__business'))
+        FlakyEmailBackend.opened = 0
+
+        self.assertEqual(send_reminder_batch(appointments, '24 hours', 'reminder_24h_sent', batch_size=2), 4)
+
+        self.assertEqual(FlakyEmailBackend.opened, 3)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(
+            set(Appointment.objects.filter(reminder_24h_sent=False).values_list('guest_email', flat=True)),
+            {'bounce@example.com'},
+        )
+
+
+class VisitorRollupTests(TestCase):
+
+    def hit(self, session_key, seconds_ago, referer=None, email=None):
+        return VisitorLog.objects.create(
+            session_key=session_key, path='/', referer=referer, email=email,
+            timestamp=timezone.now() - timedelta(seconds=seconds_ago),
+        )
+
+    def test_daily_counts_sessions_conversions_and_pruning(self):
+        from .models import DemoLead
+        self.hit('lead', 30, referer='https://google.com/')
+        self.hit('lead', 20, email='lead@example.com')
+        self.hit('browser', 10)
+        self.hit('gone', 200 * 86400)
+        DemoLead.objects.create(email='lead@example.com')
+
+        result = rollup_visitor_logs(days=2, retention_days=90)
+
+        today = timezone.localdate()
+        self.assertEqual(
+            set(VisitorDailyStat.objects.filter(date=today).values_list('referer', 'visits', 'unique_sessions')),
+            {('https://google.com/', 1, 1), ('', 2, 2)},
+        )
+        lead = VisitorSession.objects.get(session_key='lead')
+        self.assertEqual((lead.visits, lead.referer, lead.email, lead.converted), (2, 'https://google.com/', 'lead@example.com', True))
+        self.assertFalse(VisitorSession.objects.get(session_key='browser').converted)
+        self.assertEqual((result['converted'], result['pruned']), (1, 1))
+        self.assertFalse(VisitorLog.objects.filter(session_key='gone').exists())
+
+        # A re-run recomputes rather than adds, and picks up the new hit
+        self.hit('browser', 5)
+        call_command('rollup_visitor_logs', stdout=StringIO())
+        self.assertEqual(VisitorDailyStat.objects.get(date=today, referer='').visits, 3)
+        self.assertEqual(VisitorSession.objects.get(session_key='browser').visits, 2)
+        self.assertEqual(VisitorSession.objects.count(), 2)
+
+
+class OwnerCalendarFeedTests(TestCase):
+
+    def setUp(self):
+        self.business = make_business()
+        self.service = Service.objects.create(business=self.business, name='Cut', default_length_minutes=30, price=100)
+        self.day = next_weekday(0)
+        self.url = f'/business/{self.business.id}/owner/calendar-events/'
+        self.client.force_login(self.business.owner)
+
+    def window(self, days=7, etag=None):
+        end = self.day + timedelta(days=days)
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get(self.url, {'start': f'{self.day}T00:00:00+02:00', 'end': end.isoformat()}, headers=headers)
+
+    def test_window_etag_and_limit(self):
+        inside = book(self.business, self.service, self.day, time(10))
+        book(self.business, self.service, self.day + timedelta(days=7), time(10))
+
+        response = self.window()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([event['id'] for event in response.json()], [inside.id])
+        self.assertEqual(response.json()[0]['start'], f'{self.day}T10:00')
+
+        etag = response['ETag']
+        self.assertEqual(self.window(etag=etag).status_code, 304)
+        book(self.business, self.service, self.day + timedelta(days=1), time(9))
+        changed = self.window(etag=etag)
+        self.assertEqual((changed.status_code, len(changed.json())), (200, 2))
+
+        self.assertEqual(self.window(days=93).status_code, 200)
+        self.assertEqual(self.window(days=94).status_code, 400)
+
+    def test_other_users_are_refused(self):
+        self.client.force_login(User.objects.create(username='stranger'))
+        self.assertEqual(self.window().status_code, 403)
+
+
+class RollupParityTests(TestCase):
+    """The signal-maintained rollups must equal what the nightly rebuild computes from scratch."""
+
+    def setUp(self):
+        self.business = make_business()
+        self.staff = Staff.objects.get(business=self.business)
+        self.second_staff = Staff.objects.create(business=self.business, name='Second')
+        self.cut = Service.objects.create(business=self.business, name='Cut', default_length_minutes=30, price=100)
+        self.colour = Service.objects.create(business=self.business, name='Colour', default_length_minutes=90, price=350)
+        self.day = timezone.localdate() - timedelta(days=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book(self.business, self.cut, self.day, time(9), staff=self.staff, status='completed')
+            book(self.business, self.colour, self.day, time(9), staff=self.second_staff, status='completed')
+            book(self.business, self.cut, self.day, time(11), status='confirmed')
+            no_show = book(self.business, self.colour, self.day, time(14), staff=self.staff)
+            no_show.deposit_paid, no_show.amount_to_pay, no_show.status = True, 50, 'cancelled'
+            no_show.save()
+            moved = book(self.business, self.cut, self.day, time(15), staff=self.second_staff)
+            moved.appointment_date = self.day + timedelta(days=1)
+            moved.save()
+
+    def snapshot(self, model, *keys):
+        fields = (*keys, 'date', 'bookings', 'completed', 'revenue', 'no_show_profit', 'hourly', 'services')
+        return sorted(model.objects.filter(business=self.business).values_list(*fields))
+
+    def test_rebuild_daily_stats_matches_live_rollups(self):
+        live = self.snapshot(DailyBusinessStats), self.snapshot(DailyStaffStats, 'staff_id')
+        day = DailyBusinessStats.objects.get(business=self.business, date=self.day)
+        self.assertEqual((day.bookings, day.completed, day.revenue, day.no_show_profit), (4, 2, 450, 50))
+        self.assertEqual(day.hourly, {'9': 2, '11': 1, '14': 1})
+
+        DailyBusinessStats.objects.all().delete()
+        DailyStaffStats.objects.all().delete()
+        call_command('rebuild_daily_stats', '--days', '3', stdout=StringIO())
+
+        self.assertEqual((self.snapshot(DailyBusinessStats), self.snapshot(DailyStaffStats, 'staff_id')), live)
+
+    def test_rebuild_client_stats_matches_live_rollups(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(
+                booking_form=self.business.booking_form, service=self.colour, appointment_date=self.day,
+                appointment_start_time=time(16), status='completed', guest_name='Other', guest_email='other@example.com',
+            )
+        fields = ('client__email', 'visit_count', 'last_visit_date', 'lifetime_value', 'deposits_collected', 'favourite_service')
+        live = sorted(ClientStats.objects.filter(business=self.business).values_list(*fields))
+        self.assertEqual(live, [
+            ('guest@example.com', 2, self.day, 450, 0, self.cut.id),
+            ('other@example.com', 1, self.day, 350, 0, self.colour.id),
+        ])
+
+        ClientStats.objects.all().delete()
+        call_command('rebuild_client_stats', stdout=StringIO())
+
+        self.assertEqual(sorted(ClientStats.objects.filter(business=self.business).values_list(*fields)), live)
+
+    def test_batch_loaded_client_metrics_match_the_per_client_properties(self):
+        from .models import ClientProfile
+        from .utils import load_client_metrics
+        Appointment.objects.create(
+            booking_form=self.business.booking_form, service=self.colour, appointment_date=self.day,
+            appointment_start_time=time(16), status='completed', guest_name='Other', guest_email='other@example.com',
+        )
+        ClientProfile.objects.create(business=self.business, name='No visits', email='new@example.com')
+        properties = (
+            'appointment_count', 'total_spent', 'total_deposit_paid', 'most_selected_service', 'last_service',
+        )
+
+        def metrics(client):
+            return [getattr(client, name) for name in properties] + [[a.id for a in client.recent_appointments]]
+
+        clients = list(ClientProfile.objects.filter(business=self.business).order_by('email'))
+        expected = [metrics(client) for client in clients]
+        loaded = list(ClientProfile.objects.filter(business=self.business).order_by('email'))
+        with self.assertNumQueries(2):
+            load_client_metrics(loaded)
+
+        with self.assertNumQueries(0):
+            self.assertEqual([metrics(client) for client in loaded], expected)
+        self.assertEqual(expected[0][:4], [5, 450, 0, 'Cut'])
+
+
+class AnalyticsExportTests(TestCase):
+
+    def setUp(self):
+        self.business = make_business()
+        staff = Staff.objects.get(business=self.business)
+        service = Service.objects.create(business=self.business, name='Cut', default_length_minutes=30, price=100)
+        self.start = timezone.localdate() - timedelta(days=20)
+        book(self.business, service, self.start, time(9), staff=staff, status='completed')
+        book(self.business, service, self.start + timedelta(days=1), time(10))
+        book(self.business, service, self.start - timedelta(days=1), time(9))
+        self.client.force_login(self.business.owner)
+
+    def export(self, export_format, **params):
+        params = {'report_type': 'custom', 'start_date': self.start.isoformat(),
+                  'end_date': (self.start + timedelta(days=1)).isoformat(), 'format': export_format, **params}
+        return self.client.get('/analytics/export/', params)
+
+    def test_csv_and_jsonl_stream_the_requested_range(self):
+        response = self.export('csv')
+        self.assertTrue(response.streaming)
+        self.assertIn(f'custom_report_{self.start:%Y%m%d}-', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Date,Time,Customer,Staff,Service,Price,Status,Deposit Paid')
+        self.assertEqual(lines[1], f'{self.start},09:00:00,Guest,owner-Studio,Cut,100.00,Completed,No')
+        self.assertEqual(len(lines), 3)
+
+        records = [json.loads(line) for line in b''.join(self.export('jsonl').streaming_content).splitlines()]
+        self.assertEqual([record['Status'] for record in records], ['Completed', 'Confirmed'])
+
+    def test_xlsx_is_a_readable_workbook(self):
+        workbook = zipfile.ZipFile(BytesIO(b''.join(self.export('xlsx').streaming_content)))
+        self.assertIsNone(workbook.testzip())
+        sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 3)
+        self.assertIn('<t>Deposit Paid</t>', sheet)
+
+    def test_bad_requests_are_rejected(self):
+        self.assertEqual(self.export('pdf').status_code, 400)
+        self.assertEqual(self.export('csv', start_date='').status_code, 400)
+        self.assertEqual(self.export('csv', end_date=(self.start - timedelta(days=2)).isoformat()).status_code, 400)
+
+
+class WeeklyScheduleTests(TestCase):
+    """Which hours apply to a staff member on a date (see the precedence in schedule.py)."""
+
+    def test_override_precedence(self):
+        from .models import ScheduleOverride, WorkingHours
+        from .utils import compile_weekly_schedule
+        business = make_business()
+        buckets = Staff.objects.get(business=business)
+        weekly = Staff.objects.create(business=business, name='Weekly')
+        default = Staff.objects.create(business=business, name='Default')
+        StaffOperatingHours.objects.create(staff=buckets, day_type='mon_fri', open_time=time(10), close_time=time(16))
+        WorkingHours.objects.create(business=business, staff=weekly, weekday=0, open_time=time(9), close_time=time(12))
+        WorkingHours.objects.create(business=business, staff=weekly, weekday=0, open_time=time(13), close_time=time(17))
+        monday, closed_monday = next_weekday(0), next_weekday(0, weeks_ahead=2)
+        tuesday, saturday = monday + timedelta(days=1), monday + timedelta(days=5)
+        ScheduleOverride.objects.create(business=business, date=monday, open_time=time(11), close_time=time(15))
+        ScheduleOverride.objects.create(business=business, staff=buckets, date=monday)
+        ScheduleOverride.objects.create(business=business, date=closed_monday)
+
+        with self.assertNumQueries(4):
+            schedule = compile_weekly_schedule(business)
+
+        def hours(day, staff=None):
+            return [(low // 60, high // 60) for low, high in schedule.ranges_for(day, staff.id if staff else None)]
+
+        # Own override beats everything, the business override clips weekly hours or replaces the default
+        self.assertEqual(hours(monday, buckets), [])
+        self.assertEqual(hours(monday, weekly), [(11, 12), (13, 15)])
+        self.assertEqual(hours(monday, default), [(11, 15)])
+        self.assertEqual(hours(monday), [(11, 15)])
+        # A business closure closes everyone
+        self.assertEqual([hours(closed_monday, staff) for staff in (buckets, weekly, default)], [[], [], []])
+        # No override: weekly rows (a weekday without rows is off), else buckets, else the business
+        self.assertEqual(hours(tuesday, weekly), [])
+        self.assertEqual(hours(tuesday, buckets), [(10, 16)])
+        self.assertEqual(hours(saturday, buckets), [(9, 13)])
+        self.assertEqual(hours(tuesday, default), [(8, 18)])
+
+
+@override_settings(AVAILABILITY_CACHE_TIMEOUT=0)
+class StoredLengthTests(TestCase):
+    """Bookings keep the length they were made with when the service is later changed."""
+
+    def test_service_length_change_does_not_stretch_existing_bookings(self):
+        business = make_business(buffer_time=10)
+        service = Service.objects.create(business=business, name='Cut', default_length_minutes=30, price=100)
+        day = next_weekday(1)
+        appointment = book(business, service, day, time(10))
+
+        service.default_length_minutes = 90
+        service.save()
+        appointment.status = 'rescheduled'
+        appointment.save()
+        appointment.refresh_from_db()
+
+        self.assertEqual(appointment.length_minutes, 30)
+        self.assertEqual(timezone.localtime(appointment.ends_at).time(), time(10, 30))
+        for engine in ('legacy', 'interval'):
+            slots = get_available_times(business, day, 30, engine=engine)
+            # 10:30 end + 10 minute buffer; a 90 minute booking would block until 11:40
+            self.assertNotIn(time(10, 30), slots, engine)
+            self.assertIn(time(10, 40), slots, engine)
+
+        # A new booking takes the new length
+        self.assertEqual(book(business, service, day, time(14)).length_minutes, 90)
+
+
+class ConflictPrefilterTests(TestCase):
+    """_overlapping_appointments: only bookings whose buffered span meets the window leave the database."""
+
+    def test_window_edges_buffer_and_spans_across_midnight(self):
+        from .utils import _day_window, _overlapping_appointments
+        business = make_business(buffer_time=10)
+        cut = Service.objects.create(business=business, name='Cut', default_length_minutes=30, price=100)
+        night = Service.objects.create(business=business, name='Night shift', default_length_minutes=720, price=100)
+        day = next_weekday(2)
+        bookings = {
+            'ends at window start - buffer': book(business, cut, day, time(7, 20)),
+            'ends a minute later': book(business, cut, day, time(7, 21)),
+            'starts a minute before window end + buffer': book(business, cut, day, time(18, 9)),
+            'starts at window end + buffer': book(business, cut, day, time(18, 10)),
+            'from the night before': book(business, night, day - timedelta(days=1), time(20)),
+            'cancelled': book(business, cut, day, time(15), status='cancelled'),
+            'moved here': book(business, cut, day + timedelta(days=1), time(12)),
+        }
+        moved = bookings['moved here']
+        moved.appointment_date = day
+        moved.save()
+
+        window_start, window_end = _day_window(day, [(8 * 60, 18 * 60)])
+
+        def found(**kwargs):
+            rows = _overlapping_appointments(Q(business=business), window_start, window_end, 10, **kwargs)
+            ids = {(row.appointment_date, row.appointment_start_time) for row in rows}
+            return {label for label, appt in bookings.items()
+                    if (appt.appointment_date, appt.appointment_start_time) in ids}
+
+        self.assertEqual(found(), {
+            'ends a minute later', 'starts a minute before window end + buffer', 'from the night before', 'moved here',
+        })
+        self.assertNotIn('moved here', found(exclude_pk=moved.pk))
+
+class SchedulerCommandTests(TestCase):
+    """run_reminders: one instance at a time, and --loop survives a failed pass."""
+
+    def setUp(self):
+        lock_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(lock_dir.cleanup)
+        settings_override = override_settings(SCHEDULER_LOCK_DIR=lock_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_second_instance_exits_while_the_lock_is_held(self):
+        out = StringIO()
+        with mock.patch('bookingApp.management.commands.run_reminders.trigger_pending_reminders') as trigger:
+            with single_instance_lock('reminders') as acquired:
+                self.assertTrue(acquired)
+                call_command('run_reminders', stdout=out)
+            self.assertIn('already running', out.getvalue())
+            trigger.assert_not_called()
+
+            # Released on exit, so the next run goes ahead
+            call_command('run_reminders', stdout=StringIO())
+            trigger.assert_called_once()
+
+    def test_loop_keeps_running_after_a_failed_pass(self):
+        out = StringIO()
+        command = 'bookingApp.management.commands.run_reminders'
+        with mock.patch(f'{command}.trigger_pending_reminders', side_effect=[RuntimeError('SMTP down'), None]) as trigger, \
+                mock.patch(f'{command}.time.sleep', side_effect=[None, KeyboardInterrupt]) as pause, \
+                self.assertLogs(command, 'ERROR'):
+            call_command('run_reminders', '--loop', '--interval', '60', stdout=out)
+
+        self.assertEqual(trigger.call_count, 2)
+        pause.assert_called_with(60)
+        self.assertIn('Reminder scheduler stopped.', out.getvalue())
@@ -34,6 +34,7 @@ urlpatterns = [
     path('business/<int:business_id>/', views.business_detail, name='business_detail'),
     path('business/register/', views.register_business, name='register_business'),
     path('business/<int:business_id>/owner/dashboard/', views.owner_dashboard, name='owner_dashboard'),
+    path('business/<int:business_id>/owner/calendar-events/', views.owner_calendar_events, name='owner_calendar_events'),
     path('business/<int:business_id>/owner/bookingform/create/', views.booking_form_create, name='booking_form_create'),
     path('business/<int:business_id>/owner/bookingform/<int:booking_form_id>/edit/', views.booking_form_edit, name='booking_form_edit'),
     path('analytics/export/', ExportAnalyticsCSVView.as_view(), name='export_analytics_csv'),
@@ -86,6 +87,7 @@ urlpatterns = [
     # urls.py
     path('api/available-slots/', views.api_get_available_slots, name='api_available_slots'),
     path('api/get-available-slots/', views.api_get_available_slots, name='api_get_available_slots'),
+    path('api/availability/range/', views.api_get_available_range, name='api_availability_range'),
     path('booking_form/<int:booking_form_id>/book/', book_appointment, name='book_appointment'),
 
     path('ajax/available-slots/', views.get_available_slots_ajax, name='ajax_available_slots'),
@@ -6,6 +6,7 @@ from django.http import (
     JsonResponse,
     HttpResponse,
     HttpResponseForbidden,
+    HttpResponseNotModified,
 )
 from django.contrib import messages
 from django.contrib.auth import login, logout
@@ -13,6 +14,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.csrf import csrf_exempt
+from django.utils.cache import patch_cache_control
 from django.views.decorators.http import require_POST
 from django.views.decorators.clickjacking import xframe_options_exempt
 from django.views.generic import TemplateView
@@ -20,6 +22,7 @@ from django.template.loader import render_to_string
 from django.conf import settings
 from django.utils import timezone
 from django.utils.timezone import localtime
+from django.db import transaction
 from django.db.models import (
     Q,
     Avg,
@@ -94,8 +97,13 @@ from .forms import (
 # ===========================
 from .utils import (
     get_available_times,
-    trigger_pending_reminders,
-    cleanup_expired_appointments,
+    get_available_times_range,
+    get_booking_slots,
+    get_pending_count,
+    apply_status_change_side_effects,
+    load_client_metrics,
+    reserve_slot,
+    SlotUnavailable,
     generate_payfast_url,
     generate_appointment_payfast_url,
     send_deposit_request_email,
@@ -112,7 +120,7 @@ from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib.auth import login
 from django.shortcuts import redirect, render
-from django.db.models import Count
+from django.db.models import Count, Exists, OuterRef
 from .models import VisitorLog, DemoLead, ClientProfile
 
 def get_abandoned_sessions():
@@ -120,13 +128,11 @@ def get_abandoned_sessions():
     Returns sessions that visited the landing page
     but do not have an associated DemoLead or ClientProfile.
     """
-    # 1. Get all emails already in your system
-    captured_emails = set(DemoLead.objects.values_list('email', flat=True)) | \
-                      set(ClientProfile.objects.values_list('email', flat=True))
-
-    # 2. Find VisitorLogs where we captured an email but they haven't "converted"
-    # (i.e., they are in VisitorLog but not in DemoLead/ClientProfile)
-    abandoned = VisitorLog.objects.filter(email__isnull=False).exclude(email__in=captured_emails)
+    # Anti-join in the database instead of pulling every captured email into Python
+    abandoned = VisitorLog.objects.filter(email__isnull=False).filter(
+        ~Exists(DemoLead.objects.filter(email=OuterRef('email'))),
+        ~Exists(ClientProfile.objects.filter(email=OuterRef('email'))),
+    )
 
     return abandoned
 def lead_capture_view(request):
@@ -787,7 +793,7 @@ import urllib.parse
 from .models import (
     Business, Staff, Appointment, OperatingHours, BusinessBlock
 )
-from .utils import cleanup_expired_appointments, generate_payfast_url
+from .utils import generate_payfast_url
 
 
 # --- HELPER FUNCTION: SOFT VALIDATION ---
@@ -831,7 +837,7 @@ def owner_dashboard(request, business_id):
     current_price = business.subscription_price
 
     # --- 1. CLEANUP ---
-    cleanup_expired_appointments(business)
+    # Unpaid deposit holds are cancelled by the `expire_holds` job; GET does no writes.
 
     # --- 2. PERMISSION CHECK (Owner OR Admin Staff) ---
     is_owner = business.owner == request.user
@@ -1005,15 +1011,12 @@ def owner_dashboard(request, business_id):
     today = timezone.now().date()
     booking_form = getattr(business, 'booking_form', None)
 
-    base_appointments = Appointment.objects.filter(
-        booking_form__business=business
-    ).select_related('service', 'customer').order_by('appointment_start_time')
+    base_appointments = Appointment.objects.for_business(business).select_related(
+        'service', 'customer'
+    ).order_by('appointment_start_time')
 
-    calendar_events = [{
-        'title': appt.customer.name if appt.customer else f"{appt.guest_name} (Guest)",
-        'start': f"{appt.appointment_date.isoformat()}T{appt.appointment_start_time.strftime('%H:%M:%S')}",
-        'backgroundColor': '#6366f1' if appt.status == 'confirmed' else ('#ef4444' if appt.status == 'cancelled' else '#f59e0b'),
-    } for appt in base_appointments]
+    # Calendar events (past ones included) are fetched per visible window from
+    # owner_calendar_events rather than inlined into the page.
 
     context = {
         'business': business,
@@ -1028,14 +1031,10 @@ def owner_dashboard(request, business_id):
         'upcoming_appointments': base_appointments.filter(
             appointment_date__gte=today
         ).exclude(status__in=['completed', 'cancelled', 'declined']),
-        'past_appointments': base_appointments.filter(
-            Q(appointment_date__lt=today) | Q(status__in=['completed', 'cancelled', 'declined'])
-        ).order_by('-appointment_date', '-appointment_start_time'),
         'operating_hours': {oh.day_type: oh for oh in business.operating_hours.all()},
         'business_blocks': business.blocks.filter(block_date__gte=today),
         'services': business.services.all(),
         'staff_members': business.staff_members.all().select_related('user__profile'),
-        'calendar_events': calendar_events,
         'is_owner': is_owner,
         'is_admin': (is_owner or is_admin_staff),
         'deposit_required': business.deposit_required,
@@ -1043,6 +1042,63 @@ def owner_dashboard(request, business_id):
 
     return render(request, 'bookingApp/owner_dashboard.html', context)
 
+
+MAX_CALENDAR_WINDOW_DAYS = 93
+CALENDAR_EVENT_COLORS = {'confirmed': '#4f46e5', 'cancelled': '#ef4444', 'pending': '#f59e0b'}
+
+@login_required
+def owner_calendar_events(request, business_id):
+    """
+    FullCalendar event feed for the owner dashboard. Returns only the visible
+    window (FullCalendar's `start`/`end` params, end exclusive) as compact JSON,
+    with an ETag so unchanged windows come back as 304s.
+    """
+    business = get_object_or_404(Business, id=business_id)
+
+    is_owner = business.owner == request.user
+    staff_profile = business.staff_members.filter(user=request.user).first()
+    is_admin_staff = staff_profile and staff_profile.role == "Admin/Co-Owner" and staff_profile.is_active
+    if not (is_owner or is_admin_staff):
+        return JsonResponse({'error': 'Access denied'}, status=403)
+
+    try:
+        # FullCalendar sends ISO datetimes (2026-09-28T00:00:00+02:00); only the day matters
+        start_date = datetime.strptime(request.GET.get('start', '')[:10], '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.GET.get('end', '')[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'error': 'start and end must be ISO dates'}, status=400)
+
+    if end_date <= start_date or (end_date - start_date).days > MAX_CALENDAR_WINDOW_DAYS:
+        return JsonResponse({'error': f'Window must be 1-{MAX_CALENDAR_WINDOW_DAYS} days'}, status=400)
+
+    rows = Appointment.objects.for_business(business).filter(
+        appointment_date__gte=start_date,
+        appointment_date__lt=end_date,
+    ).order_by().values_list(
+        'id', 'appointment_date', 'appointment_start_time', 'status',
+        'guest_name', 'customer__name', 'service__name',
+    )
+
+    events = [{
+        'id': appt_id,
+        'title': customer_name or f"{guest_name} (Guest)",
+        'start': f"{appt_date.isoformat()}T{start_time.strftime('%H:%M')}",
+        'color': CALENDAR_EVENT_COLORS.get(status, '#cbd5e1'),
+        'status': status,
+        'service': service_name or '',
+    } for appt_id, appt_date, start_time, status, guest_name, customer_name, service_name in rows]
+
+    body = json.dumps(events, separators=(',', ':'))
+    etag = f'"{hashlib.md5(body.encode()).hexdigest()}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    # Private: per-owner data. Short max-age, then revalidate with the ETag.
+    patch_cache_control(response, private=True, max_age=30)
+    return response
+
 def book_appointment_public(request, token):
     # 1. Fetch the form first so we know WHO the business is
     booking_form = get_object_or_404(BookingForm.objects.select_related('business__owner'), embed_token=token)
@@ -1225,8 +1281,6 @@ from .utils import (
     calculate_deposit_amount,
     generate_appointment_payfast_url,
     send_deposit_request_email,
-    send_push_notification,
-    trigger_pending_reminders
 )
 logger = logging.getLogger(__name__)
 
@@ -1245,9 +1299,6 @@ def book_appointment(request, business_slug=None, booking_form_id=None):
             'business': business,
         })
 
-    # Trigger background tasks (e.g., automated reminders)
-    trigger_pending_reminders()
-
     services = Service.objects.filter(business=business)
     staff_members = Staff.objects.filter(business=business, is_active=True)
     is_embedded = request.GET.get('embed') == 'true'
@@ -1272,10 +1323,10 @@ def book_appointment(request, business_slug=None, booking_form_id=None):
         if selected_date_str and selected_service:
             try:
                 selected_date = datetime.strptime(selected_date_str, '%Y-%m-%d').date()
-                available_times = get_available_times(
+                available_times, _ = get_booking_slots(
                     business,
                     selected_date,
-                    selected_service.default_length_minutes,
+                    selected_service,
                     staff_id=selected_staff_id if selected_staff_id and selected_staff_id != 'None' else None
                 )
             except (ValueError, AttributeError):
@@ -1354,53 +1405,46 @@ def book_appointment(request, business_slug=None, booking_form_id=None):
             if selected_staff_id and selected_staff_id != 'None':
                 appointment.staff_id = selected_staff_id
 
-            appointment.save()
-
-            # --- PUSH NOTIFICATION LOGIC ---
+            # Owner/staff push notifications are sent (as one call) by the
+            # notify_new_appointment post_save signal.
+            # The slot is re-checked and saved under a per-day lock, so two
+            # customers submitting the same time can't both get it.
             try:
-                owner = business.owner
-                player_id = getattr(owner.profile, "onesignal_player_id", None)
+                reserve_slot(business, appointment, selected_service, staff_id=appointment.staff_id)
+            except SlotUnavailable:
+                form.add_error('appointment_start_time', "Sorry, that time was just booked. Please pick another slot.")
+            else:
+                # Handle Redirection / Success
+                if requires_payment:
+                    try:
+                        pay_url = generate_appointment_payfast_url(request, appointment)
+
+                        # Only send email if a deposit is actually required and amount > 0
+                        send_deposit_request_email(appointment, pay_url)
+
+                        # Return JavaScript Breakout for iFrames/Embedded forms
+                        return HttpResponse(f"""
+                            <html>
+                                <head><title>Redirecting...</title></head>
+                                <body style="text-align:center; padding-top:50px; font-family:sans-serif;">
+                                    <h2>Redirecting to Secure Payment...</h2>
+                                    <p>If not redirected, <a href="{pay_url}" target="_top">click here</a>.</p>
+                                    <script type="text/javascript">
+                                        window.top.location.href = "{pay_url}";
+                                    </script>
+                                </body>
+                            </html>
+                        """)
+                    except Exception as e:
+                        logger.error(f"Payment Redirect Error: {e}")
+                        messages.warning(request, "Payment redirect failed, but a link has been emailed to you.")
+                        return render(request, 'bookingApp/booking_success_guest.html', {'appointment': appointment})
 
-                if player_id:
-                    msg = f"New booking from {appointment.guest_name} for {appointment.service.name}"
-                    send_push_notification([player_id], msg)
                 else:
-                    logger.warning(f"No OneSignal player ID for owner {owner.id}")
-            except Exception as e:
-                logger.error(f"Failed to send owner notification: {e}")
-            # --- END PUSH NOTIFICATION ---
-
-            # Handle Redirection / Success
-            if requires_payment:
-                try:
-                    pay_url = generate_appointment_payfast_url(request, appointment)
-
-                    # Only send email if a deposit is actually required and amount > 0
-                    send_deposit_request_email(appointment, pay_url)
-
-                    # Return JavaScript Breakout for iFrames/Embedded forms
-                    return HttpResponse(f"""
-                        <html>
-                            <head><title>Redirecting...</title></head>
-                            <body style="text-align:center; padding-top:50px; font-family:sans-serif;">
-                                <h2>Redirecting to Secure Payment...</h2>
-                                <p>If not redirected, <a href="{pay_url}" target="_top">click here</a>.</p>
-                                <script type="text/javascript">
-                                    window.top.location.href = "{pay_url}";
-                                </script>
-                            </body>
-                        </html>
-                    """)
-                except Exception as e:
-                    logger.error(f"Payment Redirect Error: {e}")
-                    messages.warning(request, "Payment redirect failed, but a link has been emailed to you.")
+                    # Case: Deposit Exempt OR Business doesn't require deposit
+                    messages.success(request, "Appointment requested successfully!")
                     return render(request, 'bookingApp/booking_success_guest.html', {'appointment': appointment})
 
-            else:
-                # Case: Deposit Exempt OR Business doesn't require deposit
-                messages.success(request, "Appointment requested successfully!")
-                return render(request, 'bookingApp/booking_success_guest.html', {'appointment': appointment})
-
     else:
         # GET REQUEST - Initial Page Load
         selected_date = date.today()
@@ -1410,8 +1454,10 @@ def book_appointment(request, business_slug=None, booking_form_id=None):
         if selected_service:
             staff_members = staff_members.filter(services=selected_service)
 
-        duration = selected_service.default_length_minutes if selected_service else 30
-        available_times = get_available_times(business, selected_date, duration)
+        if selected_service:
+            available_times, _ = get_booking_slots(business, selected_date, selected_service)
+        else:
+            available_times = get_available_times(business, selected_date, 30)
 
         # Pre-fill data for logged-in users
         initial_data = {}
@@ -1444,9 +1490,6 @@ def booking_success(request, appointment_id):
     appointment = get_object_or_404(Appointment, id=appointment_id)
     business = appointment.booking_form.business
 
-    # Optional: Run your cleanup logic if needed
-    # cleanup_expired_appointments(business)
-
     # Refresh DB status (in case ITN processed faster than the redirect)
     appointment.refresh_from_db()
 
@@ -1558,11 +1601,18 @@ def staff_dashboard(request):
         # Mark Appointment as Completed
         elif 'complete_appointment' in request.POST:
             appt_id = request.POST.get('appointment_id')
-            Appointment.objects.filter(
+            to_complete = Appointment.objects.filter(
                 id=appt_id,
                 staff=staff_profile,
                 status='confirmed'
-            ).update(status='completed')
+            )
+            changed_ids = list(to_complete.values_list('id', flat=True))
+            to_complete.update(status='completed')
+            # .update() skips signals; these quick actions have never emailed the client
+            apply_status_change_side_effects(
+                Appointment.objects.filter(id__in=changed_ids).select_related('customer'),
+                'confirmed', 'completed', notify=False,
+            )
             messages.success(request, "Appointment marked as completed.")
 
         # Inside if request.method == "POST":
@@ -1570,11 +1620,17 @@ def staff_dashboard(request):
         # Add this block:
         elif 'confirm_appointment' in request.POST:
             appt_id = request.POST.get('appointment_id')
-            Appointment.objects.filter(
+            to_confirm = Appointment.objects.filter(
                 id=appt_id,
                 staff=staff_profile,
                 status='pending'
-            ).update(status='confirmed')
+            )
+            changed_ids = list(to_confirm.values_list('id', flat=True))
+            to_confirm.update(status='confirmed')
+            apply_status_change_side_effects(
+                Appointment.objects.filter(id__in=changed_ids).select_related('customer'),
+                'pending', 'confirmed', notify=False,
+            )
             messages.success(request, "Appointment confirmed.")
 
         return redirect('staff_dashboard')
@@ -1658,19 +1714,17 @@ def get_available_slots_ajax(request):
         service = get_object_or_404(Service, id=s_id)
         date_obj = datetime.strptime(d_str, '%Y-%m-%d').date()
 
-        # 3. Get Slots
-        slots = get_available_times(
-            business=business,
-            appointment_date=date_obj,
-            service_length=service.default_length_minutes,
-            staff_id=staff_id
-        )
+        # 3. Get Slots (no staff chosen = any available staff member)
+        slots, staff_by_slot = get_booking_slots(business, date_obj, service, staff_id=staff_id)
 
         # 4. Format for JSON
         formatted_slots = [
             {'value': t.strftime('%H:%M'), 'label': t.strftime('%I:%M %p')}
             for t in slots
         ]
+        if staff_by_slot is not None:
+            for slot, t in zip(formatted_slots, slots):
+                slot['staff_ids'] = staff_by_slot[t]
 
         return JsonResponse({'slots': formatted_slots})
 
@@ -1946,26 +2000,16 @@ def appointment_reschedule(request, token):
             new_date = form.cleaned_data.get('appointment_date')
             new_time = form.cleaned_data.get('appointment_start_time')
 
-            # Standardize time format for comparison
-            new_time_str = new_time.strftime('%H:%M') if hasattr(new_time, 'strftime') else new_time
+            # The field is a CharField fed by JS, so normalise it to a time for the slot check
+            if not hasattr(new_time, 'strftime'):
+                try:
+                    new_time = datetime.strptime(new_time, '%H:%M').time()
+                except (TypeError, ValueError):
+                    new_time = None
             selected_staff = appointment.staff
 
-            # Check availability
-            available_slots = get_available_times(
-                business=business,
-                appointment_date=new_date,
-                service_length=appointment.service.default_length_minutes,
-                staff_id=selected_staff.id if selected_staff else None,
-                service_obj=appointment.service
-            )
-
-            available_slots_str = [
-                s.strftime('%H:%M') if hasattr(s, 'strftime') else s
-                for s in available_slots
-            ]
-
-            if new_time_str not in available_slots_str:
-                form.add_error('appointment_start_time', "The selected staff member is not available at this time.")
+            if new_time is None:
+                form.add_error('appointment_start_time', "Please pick a valid time.")
 
             else:
                 # ====================================================
@@ -1975,8 +2019,8 @@ def appointment_reschedule(request, token):
                     # Calculate the new deposit amount based on the business settings
                     new_deposit = business.calculate_deposit(appointment.service.price)
 
-                    # 1. Create a NEW Appointment object
-                    new_appt = Appointment.objects.create(
+                    # 1. Reserve a NEW Appointment at the new time (checked and saved under the day lock)
+                    new_appt = Appointment(
                         booking_form=appointment.booking_form,
                         service=appointment.service,
                         customer=appointment.customer,
@@ -1991,29 +2035,38 @@ def appointment_reschedule(request, token):
                         amount_to_pay=new_deposit,  # <--- FIX: Pass the calculated deposit here
                         notes=f"Rescheduled from Appt #{appointment.id}. Previous deposit forfeited."
                     )
-
-                    # 2. Revert the OLD appointment in memory and then cancel it
-                    # This prevents the new time from being saved to the old record
-                    appointment.refresh_from_db()
-                    appointment.status = 'cancelled'
-                    appointment.notes = (appointment.notes or "") + f"\n[SYSTEM]: Late reschedule. Deposit forfeited. Re-booked as Appt #{new_appt.id}."
-                    appointment.save()
-
-                    # 3. Handle Payment Redirect
-                    if business.deposit_required:
-                        try:
-                            pay_url = generate_appointment_payfast_url(request, new_appt)
-                            send_deposit_request_email(new_appt, pay_url)
-                            return HttpResponse(f"""
-                                <html><body>
-                                    <p>Reschedule accepted. Redirecting to payment for new deposit...</p>
-                                    <script>window.top.location.href = "{pay_url}";</script>
-                                </body></html>
-                            """)
-                        except Exception as e:
-                            return render(request, 'bookingApp/booking_success_guest.html', {'appointment': new_appt})
-
-                    return render(request, 'bookingApp/reschedule_success.html', {'appointment': new_appt, 'is_too_late': True})
+                    try:
+                        with transaction.atomic():
+                            # The old booking is cancelled below, so its current time doesn't count against the new one
+                            reserve_slot(
+                                business, new_appt, appointment.service,
+                                staff_id=new_appt.staff_id, exclude_pk=appointment.pk,
+                            )
+
+                            # 2. Revert the OLD appointment in memory and then cancel it
+                            # This prevents the new time from being saved to the old record
+                            appointment.refresh_from_db()
+                            appointment.status = 'cancelled'
+                            appointment.notes = (appointment.notes or "") + f"\n[SYSTEM]: Late reschedule. Deposit forfeited. Re-booked as Appt #{new_appt.id}."
+                            appointment.save()
+                    except SlotUnavailable:
+                        form.add_error('appointment_start_time', "The selected staff member is not available at this time.")
+                    else:
+                        # 3. Handle Payment Redirect
+                        if business.deposit_required:
+                            try:
+                                pay_url = generate_appointment_payfast_url(request, new_appt)
+                                send_deposit_request_email(new_appt, pay_url)
+                                return HttpResponse(f"""
+                                    <html><body>
+                                        <p>Reschedule accepted. Redirecting to payment for new deposit...</p>
+                                        <script>window.top.location.href = "{pay_url}";</script>
+                                    </body></html>
+                                """)
+                            except Exception as e:
+                                return render(request, 'bookingApp/booking_success_guest.html', {'appointment': new_appt})
+
+                        return render(request, 'bookingApp/reschedule_success.html', {'appointment': new_appt, 'is_too_late': True})
 
                 # ====================================================
                 # LOGIC BRANCH: EARLY RESCHEDULE (STANDARD)
@@ -2021,33 +2074,37 @@ def appointment_reschedule(request, token):
                 else:
                     # Update the existing appointment record
                     appt = form.save(commit=False)
+                    appt.appointment_start_time = new_time
                     appt.status = 'pending'
-                    appt.save()
-
-                    # Notification Logic
-                    client_name = appt.customer.name if appt.customer else appt.guest_name
-                    customer_email = appt.guest_email or (appt.customer.email if appt.customer else None)
-                    staff_recipient = appt.staff.user.email if (appt.staff and hasattr(appt.staff, 'user')) else business.owner.email
-
-                    context = {
-                        'appointment': appt,
-                        'client_name': client_name,
-                        'business': business,
-                        'site_url': settings.SITE_URL,
-                        'is_too_late': False
-                    }
-
-                    # Notify Staff
-                    if staff_recipient:
-                        html_staff = render_to_string('bookingApp/owner_reschedule_notification.html', context)
-                        send_mail(f"Reschedule Request - {client_name}", strip_tags(html_staff), settings.DEFAULT_FROM_EMAIL, [staff_recipient], html_message=html_staff, fail_silently=True)
-
-                    # Notify Customer
-                    if customer_email:
-                        html_cust = render_to_string('bookingApp/customer_status_update.html', context)
-                        send_mail(f"Reschedule Confirmed: {business.name}", f"Hi {client_name}, your reschedule is confirmed.", settings.DEFAULT_FROM_EMAIL, [customer_email], html_message=html_cust, fail_silently=True)
-
-                    return render(request, 'bookingApp/reschedule_success.html', {'is_too_late': False})
+                    try:
+                        reserve_slot(business, appt, appt.service, staff_id=appt.staff_id, exclude_pk=appt.pk)
+                    except SlotUnavailable:
+                        form.add_error('appointment_start_time', "The selected staff member is not available at this time.")
+                    else:
+                        # Notification Logic
+                        client_name = appt.customer.name if appt.customer else appt.guest_name
+                        customer_email = appt.guest_email or (appt.customer.email if appt.customer else None)
+                        staff_recipient = appt.staff.user.email if (appt.staff and hasattr(appt.staff, 'user')) else business.owner.email
+
+                        context = {
+                            'appointment': appt,
+                            'client_name': client_name,
+                            'business': business,
+                            'site_url': settings.SITE_URL,
+                            'is_too_late': False
+                        }
+
+                        # Notify Staff
+                        if staff_recipient:
+                            html_staff = render_to_string('bookingApp/owner_reschedule_notification.html', context)
+                            send_mail(f"Reschedule Request - {client_name}", strip_tags(html_staff), settings.DEFAULT_FROM_EMAIL, [staff_recipient], html_message=html_staff, fail_silently=True)
+
+                        # Notify Customer
+                        if customer_email:
+                            html_cust = render_to_string('bookingApp/customer_status_update.html', context)
+                            send_mail(f"Reschedule Confirmed: {business.name}", f"Hi {client_name}, your reschedule is confirmed.", settings.DEFAULT_FROM_EMAIL, [customer_email], html_message=html_cust, fail_silently=True)
+
+                        return render(request, 'bookingApp/reschedule_success.html', {'is_too_late': False})
 
     else:
         form = RescheduleAppointmentForm(instance=appointment)
@@ -2137,18 +2194,12 @@ def get_notification_counts(request):
 
     # Business Owner logic (for 'All Bookings' badge)
     if hasattr(request.user, 'business'):
-        data['pending_business_count'] = Appointment.objects.filter(
-            booking_form__business=request.user.business,
-            status='pending'
-        ).count()
+        data['pending_business_count'] = get_pending_count(business_id=request.user.business.id)
 
     # Staff logic (for 'Schedule' badge)
     staff_profile = getattr(request.user, 'staff_profile', None)
     if staff_profile:
-        data['pending_staff_count'] = Appointment.objects.filter(
-            staff=staff_profile,
-            status='pending'
-        ).count()
+        data['pending_staff_count'] = get_pending_count(staff_id=staff_profile.id)
 
     return JsonResponse(data)
 
@@ -2280,7 +2331,6 @@ from django.utils.http import urlencode
 from .models import Business, Staff, Appointment
 from .forms import ManualBookingForm
 from .utils import (
-    trigger_pending_reminders,
     generate_appointment_payfast_url,
     send_deposit_request_email
 )
@@ -2300,7 +2350,6 @@ from django.utils.http import urlencode
 from .models import Business, Staff, BookingForm
 from .forms import ManualBookingForm
 from .utils import (
-    trigger_pending_reminders,
     generate_appointment_payfast_url,
     send_deposit_request_email
 )
@@ -2312,7 +2361,6 @@ def manual_booking(request, business_id):
     Now correctly references the OneToOne booking_form relationship.
     """
     business = get_object_or_404(Business, id=business_id)
-    trigger_pending_reminders()
 
     # --- Permission Check ---
     is_admin_staff = Staff.objects.filter(user=request.user, business=business, role='ADMIN').exists()
@@ -2351,38 +2399,43 @@ def manual_booking(request, business_id):
                     appointment.amount_to_pay = (price * (Decimal(deposit_percent) / Decimal('100'))).quantize(Decimal('0.01'))
                 else:
                     appointment.amount_to_pay = Decimal('0.00')
-
-                appointment.save()
-
-                # Generate PayFast URL (using the business slug indirectly via utility)
-                pay_url = generate_appointment_payfast_url(request, appointment)
-
-                # Auto-send email ONLY if guest email exists
-                #email_sent = False
-                #if appointment.guest_email:
-                #    send_deposit_request_email(appointment, pay_url)
-                #    email_sent = True
-
-                # Generate WhatsApp link for manual sharing
-                whatsapp_url = None
-                if appointment.formatted_whatsapp_number:
-                    msg = f"Hi {appointment.guest_name}, please complete your deposit for {appointment.service.name} here: {pay_url}"
-                    whatsapp_url = f"https://wa.me/{appointment.formatted_whatsapp_number}?{urlencode({'text': msg})}"
-
-                # Render success / action screen
-                return render(request, 'bookingApp/manual_booking_success.html', {
-                    'appointment': appointment,
-                    'pay_url': pay_url,
-                    'whatsapp_url': whatsapp_url,
-                    #'email_sent': email_sent
-                })
-
             else:
                 # No deposit required OR client is exempt
                 appointment.status = 'confirmed'
                 appointment.amount_to_pay = Decimal('0.00')
                 appointment.deposit_paid = True # Mark as paid since no payment is needed
-                appointment.save()
+
+            # Same per-day lock as online bookings, so a manual booking can't take a slot a customer just got.
+            # Owners may book walk-ins and out-of-hours times, so only clashes with other bookings are refused.
+            try:
+                reserve_slot(business, appointment, appointment.service, staff_id=appointment.staff_id, enforce_hours=False)
+            except SlotUnavailable:
+                form.add_error('appointment_start_time', "That staff member already has a booking at this time.")
+
+            else:
+                if deposit_needed:
+                    # Generate PayFast URL (using the business slug indirectly via utility)
+                    pay_url = generate_appointment_payfast_url(request, appointment)
+
+                    # Auto-send email ONLY if guest email exists
+                    #email_sent = False
+                    #if appointment.guest_email:
+                    #    send_deposit_request_email(appointment, pay_url)
+                    #    email_sent = True
+
+                    # Generate WhatsApp link for manual sharing
+                    whatsapp_url = None
+                    if appointment.formatted_whatsapp_number:
+                        msg = f"Hi {appointment.guest_name}, please complete your deposit for {appointment.service.name} here: {pay_url}"
+                        whatsapp_url = f"https://wa.me/{appointment.formatted_whatsapp_number}?{urlencode({'text': msg})}"
+
+                    # Render success / action screen
+                    return render(request, 'bookingApp/manual_booking_success.html', {
+                        'appointment': appointment,
+                        'pay_url': pay_url,
+                        'whatsapp_url': whatsapp_url,
+                        #'email_sent': email_sent
+                    })
 
                 status_msg = f"Booking for {appointment.guest_name} confirmed!"
                 if business.deposit_required: # Clarify bypass for exempt clients
@@ -2444,20 +2497,84 @@ def api_get_available_slots(request):
         appt_date = datetime.strptime(date_str, '%Y-%m-%d').date()
 
         # Get available slots using your logic
-        slots = get_available_times(
-            business=business,
-            appointment_date=appt_date,
-            service_length=service.default_length_minutes,
+        slots, staff_by_slot = get_booking_slots(
+            business,
+            appt_date,
+            service,
             staff_id=staff_id if staff_id and staff_id != 'None' else None
         )
 
         # Return simple list of strings: ["09:00", "09:30", ...]
-        return JsonResponse({'slots': [s.strftime('%H:%M') for s in slots]})
+        data = {'slots': [s.strftime('%H:%M') for s in slots]}
+        if staff_by_slot is not None:
+            # Which staff can take each slot, suggested assignee first
+            data['staff_by_slot'] = {t.strftime('%H:%M'): ids for t, ids in staff_by_slot.items()}
+        return JsonResponse(data)
 
     except Exception as e:
         return JsonResponse({'slots': [], 'error': str(e)}, status=400)
 
 
+MAX_AVAILABILITY_RANGE_DAYS = 62
+
+def api_get_available_range(request):
+    """
+    Returns a whole week/month of slots in one request so the booking widget can
+    grey out full days without calling api_get_available_slots per date.
+    GET params: business_id, service_id, staff_id (optional), start, end (YYYY-MM-DD).
+    """
+    business_id = request.GET.get('business_id')
+    service_id = request.GET.get('service_id')
+    staff_id = request.GET.get('staff_id')
+    start_str = request.GET.get('start')
+    end_str = request.GET.get('end')
+
+    # Basic validation
+    if not all([business_id, service_id, start_str, end_str]):
+        return JsonResponse({'days': [], 'error': 'Missing parameters'}, status=400)
+
+    try:
+        start_date = datetime.strptime(start_str, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_str, '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'days': [], 'error': 'Dates must be YYYY-MM-DD'}, status=400)
+
+    if end_date < start_date or (end_date - start_date).days >= MAX_AVAILABILITY_RANGE_DAYS:
+        return JsonResponse(
+            {'days': [], 'error': f'Range must be 1-{MAX_AVAILABILITY_RANGE_DAYS} days'},
+            status=400
+        )
+
+    business = get_object_or_404(Business, id=business_id)
+    service = get_object_or_404(Service, id=service_id, business=business)
+
+    slots_by_date = get_available_times_range(
+        business=business,
+        start_date=start_date,
+        end_date=end_date,
+        service_length=service.default_length_minutes,
+        staff_id=staff_id if staff_id and staff_id != 'None' else None,
+        service_obj=service,
+    )
+
+    days = [
+        {
+            'date': day.isoformat(),
+            'slots': [s.strftime('%H:%M') for s in slots],
+            'available': bool(slots),
+        }
+        for day, slots in sorted(slots_by_date.items())
+    ]
+
+    return JsonResponse({
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'days': days,
+        # One character per day from start to end: '1' = has openings, '0' = full/closed
+        'bitmap': ''.join('1' if d['available'] else '0' for d in days),
+    })
+
+
 
 def submit_guest_review(request, appointment_id):
     # Fetch the appointment to link the review to the correct business/client
@@ -2507,7 +2624,7 @@ from django.utils import timezone
 from datetime import timedelta
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView
-from .models import Appointment, Review, Staff, Business
+from .models import Appointment, Review, Staff, Business, DailyBusinessStats, DailyStaffStats
 
 class AnalyticsDashboardView(LoginRequiredMixin, TemplateView):
     template_name = 'bookingApp/analytics.html'
@@ -2552,16 +2669,19 @@ class AnalyticsDashboardView(LoginRequiredMixin, TemplateView):
             return context
 
         # --- 3. Data Scoping Based on Permissions ---
+        # Figures come from the DailyBusinessStats/DailyStaffStats rollups (one row per
+        # business or staff member per day) instead of aggregating raw appointments.
+        start_date_only = start_date.date()
         if has_master_access:
             # Owners and Admins see EVERYONE'S data
             context['staff_list_dropdown'] = business_obj.staff_members.all()
-            appointments = Appointment.objects.filter(staff__business=business_obj)
+            daily_rows = DailyBusinessStats.objects.filter(business=business_obj)
             reviews = Review.objects.filter(business=business_obj)
             context['scope_name'] = business_obj.name
 
             # Apply specific staff filter if selected in dropdown
             if staff_id:
-                appointments = appointments.filter(staff_id=staff_id)
+                daily_rows = DailyStaffStats.objects.filter(business=business_obj, staff_id=staff_id)
                 reviews = reviews.filter(appointment__staff_id=staff_id)
                 try:
                     context['scope_name'] = Staff.objects.get(id=staff_id).name
@@ -2569,73 +2689,58 @@ class AnalyticsDashboardView(LoginRequiredMixin, TemplateView):
                     pass
         else:
             # Regular staff only see THEIR OWN data
-            appointments = Appointment.objects.filter(staff=staff_profile)
+            daily_rows = DailyStaffStats.objects.filter(staff=staff_profile)
             reviews = Review.objects.filter(appointment__staff=staff_profile)
             context['scope_name'] = staff_profile.name
 
         # --- 4. Apply Date Filters ---
-        start_date_only = start_date.date()
-        appointments = appointments.filter(appointment_date__gte=start_date_only)
-        completed_apps = appointments.filter(status='completed')
+        daily_rows = list(daily_rows.filter(date__gte=start_date_only).order_by('date'))
 
         # --- 5. Revenue Chart Data ---
-        revenue_chart_data = (
-            completed_apps.values('appointment_date')
-            .annotate(daily_revenue=Sum('service__price'))
-            .order_by('appointment_date')
-        )
-
-        rev_labels = [d['appointment_date'].strftime(days_label_format) for d in revenue_chart_data]
-        rev_values = [float(d['daily_revenue'] or 0) for d in revenue_chart_data]
+        rev_labels = [row.date.strftime(days_label_format) for row in daily_rows if row.completed]
+        rev_values = [float(row.revenue) for row in daily_rows if row.completed]
 
         # --- 6. Busy Times (Hourly Distribution) ---
-        busy_times_raw = (
-            appointments.annotate(hour=ExtractHour('appointment_start_time'))
-            .values('hour')
-            .annotate(count=Count('id'))
-            .order_by('hour')
-        )
-
         busy_labels = []
         busy_values = []
         for h in range(8, 21):
             busy_labels.append(f"{h:02d}:00")
-            match = next((item for item in busy_times_raw if item['hour'] == h), None)
-            busy_values.append(match['count'] if match else 0)
+            busy_values.append(sum(row.hourly.get(str(h), 0) for row in daily_rows))
 
         # --- 7. Leaderboards ---
-        top_services = (
-            appointments.values('service__name')
-            .annotate(
-                count=Count('id'),
-                revenue=Sum('service__price', filter=Q(status='completed'))
-            )
-            .order_by('-count')[:5]
-        )
+        services = {}
+        for row in daily_rows:
+            for name, figures in row.services.items():
+                merged = services.setdefault(name, {'service__name': name, 'count': 0, 'revenue': 0})
+                merged['count'] += figures['count']
+                merged['revenue'] += figures['revenue']
+        top_services = sorted(services.values(), key=lambda s: s['count'], reverse=True)[:5]
 
         staff_performance = []
         # Only show staff leaderboard to Master Access users (Owner/Admin)
         if has_master_access and not staff_id:
-            staff_performance = business_obj.staff_members.annotate(
-                booking_count=Count('appointments', filter=Q(appointments__appointment_date__gte=start_date_only)),
-                revenue=Sum('appointments__service__price', filter=Q(
-                    appointments__appointment_date__gte=start_date_only,
-                    appointments__status='completed'
-                ))
-            ).order_by('-revenue')
+            totals = {
+                row['staff_id']: row
+                for row in DailyStaffStats.objects.filter(business=business_obj, date__gte=start_date_only)
+                .values('staff_id').annotate(booking_count=Sum('bookings'), revenue=Sum('revenue'))
+            }
+            staff_performance = list(business_obj.staff_members.all())
+            for member in staff_performance:
+                member.booking_count = totals.get(member.id, {}).get('booking_count', 0)
+                member.revenue = totals.get(member.id, {}).get('revenue')
+            staff_performance.sort(key=lambda m: m.revenue or 0, reverse=True)
 
         # --- 8. Metrics & Context ---
-        no_show_profit = appointments.filter(
-            status='cancelled',
-            deposit_paid=True
-        ).aggregate(total=Sum('amount_to_pay'))['total'] or 0
+        total_bookings = sum(row.bookings for row in daily_rows)
+        total_completed = sum(row.completed for row in daily_rows)
+        no_show_profit = sum((row.no_show_profit for row in daily_rows), 0)
 
         context.update({
-            'total_revenue': completed_apps.aggregate(Sum('service__price'))['service__price__sum'] or 0,
-            'total_bookings': appointments.count(),
+            'total_revenue': sum((row.revenue for row in daily_rows), 0),
+            'total_bookings': total_bookings,
             'no_show_profit': no_show_profit,
             'avg_rating': reviews.aggregate(Avg('rating'))['rating__avg'] or 0,
-            'completion_rate': (completed_apps.count() / appointments.count() * 100) if appointments.count() > 0 else 0,
+            'completion_rate': (total_completed / total_bookings * 100) if total_bookings > 0 else 0,
             'chart_labels': json.dumps(rev_labels),
             'chart_values': json.dumps(rev_values),
             'busy_labels': json.dumps(busy_labels),
@@ -2651,16 +2756,67 @@ class AnalyticsDashboardView(LoginRequiredMixin, TemplateView):
 
 
 import csv
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.views import View
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import timedelta
 from .models import Appointment
+from .utils import stream_csv, stream_jsonl, stream_xlsx
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv', stream_csv),
+    'jsonl': ('application/x-ndjson', 'jsonl', stream_jsonl),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx', stream_xlsx),
+}
 
 class ExportAnalyticsCSVView(LoginRequiredMixin, View):
+    """
+    Streams the appointment report as CSV, JSON Lines or XLSX. Rows are read with
+    iterator() over only the exported columns, so memory stays flat for year-long ranges.
+    """
+    chunk_size = 2000
+    header = ['Date', 'Time', 'Customer', 'Staff', 'Service', 'Price', 'Status', 'Deposit Paid']
+
+    def get_date_range(self, report_type):
+        today = timezone.localdate()
+        if report_type == 'custom':
+            start = parse_date(self.request.GET.get('start_date') or '')
+            end = parse_date(self.request.GET.get('end_date') or '') or today
+            if not start or start > end:
+                raise ValueError("Custom reports need a start_date (YYYY-MM-DD) on or before end_date.")
+            return start, end
+        if report_type == 'day':
+            return today, None
+        if report_type == 'week':
+            return today - timedelta(days=7), None
+        if report_type == 'year':
+            return today.replace(month=1, day=1), None
+        return today - timedelta(days=30), None  # month
+
+    def rows(self, appointments):
+        for app in appointments.iterator(chunk_size=self.chunk_size):
+            customer_name = "N/A"
+            if app.customer:
+                customer_name = app.customer.name
+            elif app.guest_name:
+                customer_name = app.guest_name
+
+            yield [
+                app.appointment_date,
+                app.appointment_start_time,
+                customer_name,
+                app.staff.name if app.staff else "N/A",
+                app.service.name if app.service else "N/A",
+                app.service.price if app.service else 0,
+                app.get_status_display(),
+                "Yes" if app.deposit_paid else "No"
+            ]
+
     def get(self, request, *args, **kwargs):
         user = self.request.user
         report_type = request.GET.get('report_type', 'month')
+        export_format = request.GET.get('format', 'csv')
         staff_id = request.GET.get('staff_id')
 
         # Identity Resolution (Owner/Admin check)
@@ -2671,51 +2827,32 @@ class ExportAnalyticsCSVView(LoginRequiredMixin, View):
         if not (is_primary_owner or is_admin_staff):
             return HttpResponse("Unauthorized", status=401)
 
-        business_obj = user.business if is_primary_owner else staff_profile.business
+        if export_format not in EXPORT_FORMATS:
+            return HttpResponseBadRequest(f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}.")
+        try:
+            start_date, end_date = self.get_date_range(report_type)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
 
-        # Dynamic Date Logic
-        now = timezone.now()
-        if report_type == 'day':
-            start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif report_type == 'week':
-            start_date = now - timedelta(days=7)
-        else: # month
-            start_date = now - timedelta(days=30)
+        business_obj = user.business if is_primary_owner else staff_profile.business
 
         # Query Data
-        appointments = Appointment.objects.filter(
-            staff__business=business_obj,
-            appointment_date__gte=start_date.date()
-        ).select_related('staff', 'service', 'customer')
-
+        appointments = Appointment.objects.for_business(business_obj).filter(
+            appointment_date__gte=start_date
+        ).select_related('staff', 'service', 'customer').only(
+            'appointment_date', 'appointment_start_time', 'status', 'deposit_paid', 'guest_name',
+            'customer__name', 'staff__name', 'service__name', 'service__price',
+        ).order_by('appointment_date', 'appointment_start_time', 'id')
+
+        if end_date:
+            appointments = appointments.filter(appointment_date__lte=end_date)
         if staff_id:
             appointments = appointments.filter(staff_id=staff_id)
 
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="{report_type}_report_{now.strftime("%Y%m%d")}.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow(['Date', 'Time', 'Customer', 'Staff', 'Service', 'Price', 'Status', 'Deposit Paid'])
-
-        for app in appointments:
-            # Fix: Use get_full_name or username instead of .name
-            customer_name = "N/A"
-            if app.customer:
-                customer_name = app.customer.name or app.customer.name
-            elif app.guest_name:
-                customer_name = app.guest_name
-
-            writer.writerow([
-                app.appointment_date,
-                app.appointment_start_time,
-                customer_name,
-                app.staff.name if app.staff else "N/A",
-                app.service.name if app.service else "N/A",
-                app.service.price if app.service else 0,
-                app.get_status_display(),
-                "Yes" if app.deposit_paid else "No"
-            ])
-
+        content_type, extension, stream = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(stream(self.header, self.rows(appointments)), content_type=content_type)
+        stamp = f"{start_date:%Y%m%d}-{end_date:%Y%m%d}" if end_date else timezone.localdate().strftime("%Y%m%d")
+        response['Content-Disposition'] = f'attachment; filename="{report_type}_report_{stamp}.{extension}"'
         return response
 
 from django.shortcuts import render, get_object_or_404
@@ -2832,8 +2969,7 @@ def master_appointments_view(request, business_id):
         filter_end = current_date_obj
 
     # 5. Base Queryset - Filter by Date Range
-    appointments_list = Appointment.objects.filter(
-        booking_form__business=business,
+    appointments_list = Appointment.objects.for_business(business).filter(
         appointment_date__range=[filter_start, filter_end]
     ).select_related('service', 'staff', 'customer').order_by('appointment_start_time')
 
@@ -3056,57 +3192,15 @@ class ClientListView(LoginRequiredMixin, ListView):
             else:
                 return ClientProfile.objects.none()
 
-        # 2. Base Relationship
-        appointments_base = Appointment.objects.filter(
-            Q(guest_email=OuterRef('email')) | Q(customer__email=OuterRef('email')),
-            service__business=business
-        )
-
-        # 3. Subqueries
-
-        # Last Appointment Date
-        last_appt_subquery = appointments_base.filter(
-            status='completed'
-        ).order_by('-appointment_date').values('appointment_date')[:1]
-
-        # Total Completed Bookings
-        count_subquery = appointments_base.filter(
-            status='completed'
-        ).annotate(
-            total_count=Count('id')
-        ).values('total_count')[:1]
-
-        # LTV Calculation: Sum of 'service__price' (Full Revenue)
-        sum_subquery = appointments_base.filter(
-            status='completed'
-        ).annotate(
-            total_revenue=Sum('service__price')
-        ).values('total_revenue')[:1]
-
-        # NEW: Total Deposits Calculation: Sum of 'amount_to_pay'
-        deposit_sum_subquery = appointments_base.filter(
-            status='completed',
-            deposit_paid=True  # <--- Filter to only include successful transactions
+        # 2. Base Queryset: figures come from the precomputed ClientStats row
+        # (see utils.refresh_client_stats); clients with no row yet show as empty.
+        queryset = ClientProfile.objects.filter(business=business).select_related(
+            'stats', 'business__owner', 'business__booking_form'
         ).annotate(
-            total_deposits=Sum('amount_to_pay')
-        ).values('total_deposits')[:1]
-
-        # 4. Base Queryset with Annotations
-        queryset = ClientProfile.objects.filter(business=business).annotate(
-            last_appointment_date=Subquery(last_appt_subquery),
-            annotated_appointment_count=Coalesce(
-                Subquery(count_subquery),
-                0
-            ),
-            annotated_total_spent=Coalesce(
-                Subquery(sum_subquery, output_field=DecimalField()),
-                Decimal('0.00')
-            ),
-            # New annotation for deposits
-            annotated_total_deposit=Coalesce(
-                Subquery(deposit_sum_subquery, output_field=DecimalField()),
-                Decimal('0.00')
-            )
+            last_appointment_date=F('stats__last_visit_date'),
+            annotated_appointment_count=Coalesce(F('stats__visit_count'), 0),
+            annotated_total_spent=Coalesce(F('stats__lifetime_value'), Decimal('0.00'), output_field=DecimalField()),
+            annotated_total_deposit=Coalesce(F('stats__deposits_collected'), Decimal('0.00'), output_field=DecimalField()),
         )
 
         # 5. Filter: Search
@@ -3123,7 +3217,7 @@ class ClientListView(LoginRequiredMixin, ListView):
         today = timezone.now().date()
         if status_filter == 'overdue':
             thirty_days_ago = today - timedelta(days=30)
-            queryset = queryset.filter(last_appointment_date__lte=thirty_days_ago)
+            queryset = queryset.filter(stats__last_visit_date__lte=thirty_days_ago)
         elif status_filter == 'new':
             thirty_days_ago = today - timedelta(days=30)
             queryset = queryset.filter(created_at__gte=thirty_days_ago)
@@ -3139,23 +3233,25 @@ class ClientListView(LoginRequiredMixin, ListView):
         sort_by = self.request.GET.get('sort', 'created_at')
         direction = self.request.GET.get('direction', 'desc')
 
+        # Sort on the raw (indexed) stats columns rather than the Coalesce annotations
         sort_map = {
             'name': 'name',
-            'revenue': 'annotated_total_spent',
-            'deposits': 'annotated_total_deposit', # Enabled sorting for new column
-            'bookings': 'annotated_appointment_count',
-            'last_visit': 'last_appointment_date',
+            'revenue': 'stats__lifetime_value',
+            'deposits': 'stats__deposits_collected',
+            'bookings': 'stats__visit_count',
+            'last_visit': 'stats__last_visit_date',
             'created_at': 'created_at'
         }
 
-        db_field = sort_map.get(sort_by, 'created_at')
-        if direction == 'desc':
-            db_field = f'-{db_field}'
+        db_field = F(sort_map.get(sort_by, 'created_at'))
+        db_field = db_field.desc(nulls_last=True) if direction == 'desc' else db_field.asc(nulls_first=True)
 
-        return queryset.order_by(db_field)
+        return queryset.order_by(db_field, 'id')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        # History popovers and last service for the whole page in two queries
+        context['clients'] = load_client_metrics(context['clients'])
         context.update({
             'current_q': self.request.GET.get('q', ''),
             'current_sort': self.request.GET.get('sort', 'created_at'),
@@ -3175,9 +3271,12 @@ def client_detail(request, client_id):
     """
     Renders the full detail page.
     """
-    client = get_object_or_404(ClientProfile, id=client_id, business=request.user.business)
-    # Get history for the timeline
-    appointments = client.get_appointments().order_by('-appointment_date', '-appointment_start_time')
+    client = get_object_or_404(
+        ClientProfile.objects.select_related('business__booking_form'), id=client_id, business=request.user.business
+    )
+    # All card metrics plus the full timeline in two queries
+    load_client_metrics([client], history_limit=None)
+    appointments = client.recent_appointments
 
     context = {
         'client': client,
@@ -183,6 +183,60 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+# Bulk senders (reminders, subscription notices) reuse one SMTP connection per batch
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', 100))
+# Outbox worker (`manage.py send_outbox`): messages per pass, and how many
+# failed attempts (retried with exponential backoff) before a row is marked failed.
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 50))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 6))
+
+
+# --- PUSH (OneSignal) ---
+ONESIGNAL_APP_ID = os.getenv('ONESIGNAL_APP_ID', '755c884c-75a6-4624-b4fe-5089ee21abac')
+ONESIGNAL_API_KEY = os.getenv('ONESIGNAL_API_KEY', 'nlqzt6d5ceouuuoptflbqxc2o')
+# Override in tests (see OneSignalStub in bookingApp/tests.py) to capture pushes locally
+ONESIGNAL_API_URL = os.getenv('ONESIGNAL_API_URL', 'https://onesignal.com/api/v1/notifications')
+ONESIGNAL_TIMEOUT = float(os.getenv('ONESIGNAL_TIMEOUT', 5))
+# Deliver pushes on a background thread so requests never wait on OneSignal
+PUSH_ASYNC = os.getenv('PUSH_ASYNC', 'True') == 'True'
+
+
+# --- VISITOR TRACKING ---
+# Landing-page hits are buffered in memory and bulk-inserted by a background thread when
+# either limit is hit. A SIGKILLed worker loses at most this many hits / seconds of traffic.
+VISITOR_LOG_BUFFER_SIZE = int(os.getenv('VISITOR_LOG_BUFFER_SIZE', 50))
+VISITOR_LOG_FLUSH_SECONDS = int(os.getenv('VISITOR_LOG_FLUSH_SECONDS', 30))
+# Raw rows older than this are deleted by `manage.py rollup_visitor_logs` (rollups are kept)
+VISITOR_LOG_RETENTION_DAYS = int(os.getenv('VISITOR_LOG_RETENTION_DAYS', 90))
+
+
+# --- AVAILABILITY ---
+# 'interval' answers slot checks from a per-day busy index; 'legacy' keeps the
+# original slot x appointment scan (identical results, used for comparison).
+AVAILABILITY_ENGINE = os.getenv('AVAILABILITY_ENGINE', 'interval')
+# Seconds a computed slot list is reused (0 disables). Invalidation is driven by signals.
+AVAILABILITY_CACHE_TIMEOUT = int(os.getenv('AVAILABILITY_CACHE_TIMEOUT', 300))
+# Seconds a compiled weekly schedule is kept. It is keyed by the availability
+# generation, so hours changes take effect immediately; this only bounds memory.
+SCHEDULE_CACHE_TIMEOUT = int(os.getenv('SCHEDULE_CACHE_TIMEOUT', 86400))
+# Unpaid deposit holds older than this are cancelled by `manage.py expire_holds`
+DEPOSIT_HOLD_MINUTES = int(os.getenv('DEPOSIT_HOLD_MINUTES', 10))
+# Pending-appointment badge counters: moved by signals, recomputed after this many seconds
+PENDING_COUNT_CACHE_TIMEOUT = int(os.getenv('PENDING_COUNT_CACHE_TIMEOUT', 900))
+
+# --- CACHE ---
+# Availability slots, compiled schedules and pending-count badges are only cached
+# on a shared backend, because their invalidations must reach every worker and the
+# cron commands. The default is the database; its table is created by migration
+# 0056 (or `manage.py createcachetable`). Point CACHE_BACKEND/CACHE_LOCATION at
+# Redis or Memcached to move it off the database. A process-local backend
+# (LocMem/Dummy) turns these caches off and slots are computed per request.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'getmebooked_cache'),
+    }
+}
 
 
 # PayFast Account Settings